@@ -0,0 +1,337 @@
+"""Benchmarks für Simulation, Sensoren und Training, mit JSON Ausgabe und Vergleich gegen eine gespeicherte Baseline.
+
+python benchmark.py misst alles und vergleicht mit benchmark_baseline.json, --save-baseline schreibt die Baseline neu.
+Die Baseline gilt nur für den Rechner auf dem sie entstanden ist.
+python benchmark.py --check misst nichts, sondern prüft die schnellen Varianten gegen ihre Vorbilder.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+import neat
+import numpy as np
+from geometry import line_intersect, point_segment_distance, segment_intersect_many, segment_intersections
+from network import NetworkBatch
+from sensors import cast_rays, load_config
+from simulation import SimulationSettings, run_generation
+from track import Track
+
+TRACK_FILE = "Rennstrecke.track"
+CONFIG_FILE = "config-feedforward.txt"
+BASELINE_FILE = "benchmark_baseline.json"
+POPULATION_SIZES = (20, 200, 2000)
+CAR_FRAMES = 500 #So viele Frames fährt BEST_CAR für die Messung der Car Methoden
+TOLERANCE = 0.25 #Erst ab 25% langsamer als die Baseline zählt es als Regression
+NETWORK_TOLERANCE = 1e-12 #tanh und sigmoid von NumPy dürfen um wenige ulp von math abweichen
+
+
+def track_segment_pairs(track):
+    """Alle Paare aus Wandstücken und Fitnesslinien der Strecke, dazu alle Wandstücke untereinander"""
+    lines = track.walls.tolist()
+    fitness = track.fitness_lines
+    lines += [[fitness[i], fitness[i+1]] for i in range(0, len(fitness) - 1, 2)]
+    return [(a[0], a[1], b[0], b[1]) for a in lines for b in lines]
+
+
+def shapely_line_intersect(p1, p2, p3, p4):
+    """Der alte Test mit zwei shapely LineStrings pro Paar"""
+    from shapely.geometry import LineString
+    return LineString([p1, p2]).intersects(LineString([p3, p4]))
+
+
+def benchmark_line_intersect(track, repeat=3):
+    """Vergleicht line_intersect, die Batch Variante und shapely auf allen Paaren der Strecke"""
+    pairs = track_segment_pairs(track)
+    results = {"pairs": len(pairs)}
+
+    def native():
+        return [line_intersect(*pair) for pair in pairs]
+
+    starts = track.walls[:, 0]
+    ends = track.walls[:, 1]
+
+    def batched():
+        return [segment_intersect_many(a, b, starts, ends)[0] for a, b in track.walls]
+
+    results["native_s"] = min(timeit.repeat(native, number=1, repeat=repeat))
+    results["batched_s"] = min(timeit.repeat(batched, number=1, repeat=repeat)) * len(pairs) / len(track.walls) ** 2
+
+    try:
+        import shapely  # pylint: disable=unused-import
+    except ImportError:
+        return results
+
+    def reference():
+        return [shapely_line_intersect(*pair) for pair in pairs]
+
+    results["shapely_s"] = min(timeit.repeat(reference, number=1, repeat=repeat))
+    results["mismatches"] = sum(a != b for a, b in zip(native(), reference()))
+    walls = [tuple(map(tuple, wall)) for wall in track.walls]
+    batched_hits = np.concatenate(batched())
+    reference_hits = [shapely_line_intersect(a[0], a[1], b[0], b[1]) for a in walls for b in walls]
+    results["mismatches"] += int((batched_hits != np.array(reference_hits)).sum())
+    results["speedup_native"] = results["shapely_s"] / results["native_s"]
+    results["speedup_batched"] = results["shapely_s"] / results["batched_s"]
+    return results
+
+
+def benchmark_car(config, frames=CAR_FRAMES, repeat=3):
+    """BEST_CAR fährt mit dem Car Modell aus car_game, gemessen wird die mittlere Zeit pro Aufruf in Sekunden
+    von Car.move, calculate_distance_points, collision_with_wall und FeedForwardNetwork.activate.
+    Car.move misst schon selbst die Sensoren, car_move_with_sensing ist deshalb Bewegung plus Sensoren.
+    calculate_distance_points wird danach allein für dieselbe Pose gemessen, das Ergebnis ist dasselbe wie in move."""
+    import car_game
+    net = neat.nn.FeedForwardNetwork.create(car_game.BEST_CAR, config)
+    names = ("car_move_with_sensing", "calculate_distance_points", "collision_with_wall", "network_activate")
+    best = dict.fromkeys(names, float("inf"))
+    for _ in range(repeat):
+        totals = dict.fromkeys(names, 0.0)
+        car = car_game.Car()
+        for _ in range(frames):
+            start = time.perf_counter()
+            car.move()
+            totals["car_move_with_sensing"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            car.calculate_distance_points()
+            totals["calculate_distance_points"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            car.collision_with_wall()
+            totals["collision_with_wall"] += time.perf_counter() - start
+            car.collision_with_fitness_line()
+
+            start = time.perf_counter()
+            output = net.activate(car.distance_list)
+            totals["network_activate"] += time.perf_counter() - start
+
+            if output[0] > 0.5:
+                car.accelerate()
+            if output[1] > 0.2:
+                car.rotate_right()
+            if output[2] > 0.2:
+                car.rotate_left()
+        for name in names:
+            best[name] = min(best[name], totals[name] / frames)
+    return {name + "_s": value for name, value in best.items()}
+
+
+def benchmark_generation(config, size, repeat=1, seed=0):
+    """Eine ganze Generation headless mit size zufälligen Genomen, immer denselben dank seed"""
+    random.seed(seed)
+    config.pop_size = size
+    genomes = list(neat.Population(config).population.items())
+    track = Track.load(TRACK_FILE)
+
+    def generation():
+        return run_generation(NetworkBatch.create(genomes, config), track)
+
+    return min(timeit.repeat(generation, number=1, repeat=repeat))
+
+
+def run_benchmarks(sizes=POPULATION_SIZES, repeat=3):
+    """Führt alle Benchmarks aus, gibt die Zeiten in Sekunden (timings), Angaben zum Rechner (info)
+    und den Vergleich von line_intersect mit shapely zurück"""
+    config = load_config(CONFIG_FILE)
+    timings = benchmark_car(config, repeat=repeat)
+    line_intersect = benchmark_line_intersect(Track.load(TRACK_FILE), repeat)
+    timings["line_intersect_s"] = line_intersect["native_s"]
+    for size in sizes:
+        timings["generation_{}_s".format(size)] = benchmark_generation(config, size, repeat=1 if size >= 2000 else repeat)
+    info = {"python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+    return {"info": info, "timings": timings, "line_intersect": line_intersect}
+
+
+def check_networks(config, size=300, mutations=20, frames=20, seed=0):
+    """Vergleicht NetworkBatch mit FeedForwardNetwork.activate für size Genome, die mit mutations Runden neuer Knoten
+    und Verbindungen tiefe Netze bekommen. Ab der Hälfte der Frames nur noch für ein zufälliges Drittel über subset.
+    Gibt die Anzahl abweichender Ausgänge zurück"""
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    config.pop_size = size
+    genomes = list(neat.Population(config).population.values())
+    for genome in genomes:
+        for _ in range(mutations):
+            genome.mutate_add_connection(config.genome_config)
+            genome.mutate_add_node(config.genome_config)
+            genome.mutate(config.genome_config)
+    nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+    batch = NetworkBatch(nets)
+    rows = np.arange(size)
+
+    mismatches = 0
+    for frame in range(frames):
+        if frame == frames // 2:
+            keep = np.sort(rng.permutation(size)[:size // 3])
+            batch = batch.subset(keep)
+            rows = rows[keep]
+        inputs = rng.uniform(0, 300, (batch.size, batch.num_inputs))
+        expected = np.array([nets[row].activate(x.tolist()) for row, x in zip(rows, inputs)])
+        mismatches += int((np.abs(batch.activate(inputs) - expected) > NETWORK_TOLERANCE).sum())
+    return mismatches
+
+
+def check_grid(track, queries=5000, max_length=400, seed=0):
+    """Vergleicht die Anfragen über das SegmentGrid mit einem Test gegen alle Wandstücke, für zufällige Strecken
+    bis max_length lang in und um die Strecke. Gibt die Anzahl abweichender Ergebnisse zurück"""
+    rng = np.random.default_rng(seed)
+    grid = track.grid
+    walls = track.walls
+    low = walls.min(axis=(0, 1)) - grid.cell_size
+    high = walls.max(axis=(0, 1)) + grid.cell_size
+    starts = rng.uniform(low, high, (queries, 2))
+    angles = rng.uniform(0, 2 * np.pi, queries)
+    ends = starts + rng.uniform(0, max_length, queries)[:, None] * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+
+    hit, t = segment_intersections(starts[:, None], ends[:, None], walls[:, 0], walls[:, 1])
+    mismatches = int((grid.any_intersection(starts, ends) != hit.any(axis=1)).sum())
+    _, distances, found = cast_rays(starts, ends[:, None], grid)
+    expected = np.where(hit, t, 1.0).min(axis=1) * np.hypot(*(ends - starts).T)
+    mismatches += int(((found[:, 0] != hit.any(axis=1)) | (distances[:, 0] != expected)).sum())
+
+    #nearby muss alle Wandstücke im Umkreis von cell_size/2 enthalten
+    near = point_segment_distance(starts[:, None], walls[:, 0], walls[:, 1]) <= grid.cell_size / 2
+    listed = np.zeros_like(near)
+    candidates = grid.nearby(starts)
+    rows = np.repeat(np.arange(queries), candidates.shape[1])
+    listed[rows[candidates.ravel() >= 0], candidates.ravel()[candidates.ravel() >= 0]] = True
+    mismatches += int((near & ~listed).sum())
+    return mismatches
+
+
+class PathRecorder:
+    """Beobachter für run_generation, merkt sich nach jedem Schritt die Mitte jedes lebenden Autos"""
+    def __init__(self, size):
+        self.paths = [[] for _ in range(size)]
+
+    def begin_frame(self):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def draw_population(self, population):
+        for car, center in zip(population.ids[:population.count], population.center_pos[:population.count]):
+            self.paths[car].append(center.copy())
+
+
+def drive_car(net, track, settings):
+    """Fährt ein Netz mit dem Car Modell aus car_game in derselben Reihenfolge wie run_generation.
+    Gibt die Fitness und die Mitte nach jedem Schritt zurück"""
+    import car_game
+    car = car_game.Car(track, settings.sensors)
+    path = []
+    steps = 0
+    while True:
+        dead = car.collision_with_wall() or car.time_since_last_fitness > settings.timeout
+        if not dead and car.collision_with_fitness_line():
+            car.fitness += 10
+            car.time_since_last_fitness = 0
+        if dead:
+            return car.fitness - 5, path
+        if car.fitness >= settings.fitness_limit or steps >= settings.max_steps:
+            return car.fitness, path
+        car.move()
+        steps += 1
+        path.append((car.center_pos.x, car.center_pos.y))
+        output = net.activate(car.distance_list)
+        if output[0] > 0.5:
+            car.accelerate()
+        if output[1] > 0.2:
+            car.rotate_right()
+        if output[2] > 0.2:
+            car.rotate_left()
+
+
+def check_car_model(config, track, size=50, mutations=5, max_steps=3000, seed=0):
+    """Vergleicht Fitness und Weg von BEST_CAR und size mutierten Genomen im Car Modell und in run_generation.
+    Gibt die Anzahl Genome zurück, deren Fitness abweicht oder deren Weg mehr als 1e-6 Pixel abweicht"""
+    import car_game
+    random.seed(seed)
+    config.pop_size = size
+    genomes = list(neat.Population(config).population.values())
+    for genome in genomes:
+        for _ in range(mutations):
+            genome.mutate(config.genome_config)
+    genomes.append(car_game.BEST_CAR)
+    nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+    settings = SimulationSettings(fitness_limit=4000, max_steps=max_steps, early_termination=False, sensors=config.sensors)
+    recorder = PathRecorder(len(nets))
+    engine = run_generation(NetworkBatch(nets), track, recorder, settings)
+    mismatches = 0
+    for net, fitness, engine_path in zip(nets, engine, recorder.paths):
+        car_fitness, path = drive_car(net, track, settings)
+        same_path = len(path) == len(engine_path) and np.allclose(path, engine_path, rtol=0, atol=1e-6)
+        mismatches += car_fitness != fitness or not same_path
+    return mismatches
+
+
+def run_checks():
+    """Führt alle Prüfungen aus, gibt die Anzahl Abweichungen pro Prüfung zurück"""
+    config = load_config(CONFIG_FILE)
+    return {"network_batch": check_networks(config),
+            "segment_grid": check_grid(Track.load(TRACK_FILE)),
+            "car_model": check_car_model(config, Track.load(TRACK_FILE))}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Verhältnis neu/Baseline für jede gemeinsame Messung und die Namen der Messungen die langsamer als erlaubt sind"""
+    ratios = {}
+    for name, value in results["timings"].items():
+        old = baseline["timings"].get(name)
+        if old:
+            ratios[name] = value / old
+    regressions = [name for name, ratio in ratios.items() if ratio > 1 + tolerance]
+    return ratios, regressions
+
+
+def save_json(data, path):
+    """Schreibt data atomar als JSON nach path"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=POPULATION_SIZES, help="Populationsgrößen für ganze Generationen")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen, gezählt wird die schnellste")
+    parser.add_argument("--output", help="Ergebnisse zusätzlich in diese JSON Datei schreiben")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline zum Vergleichen")
+    parser.add_argument("--save-baseline", action="store_true", help="Ergebnisse als neue Baseline speichern")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="erlaubte Verlangsamung, 0.25 = 25%%")
+    parser.add_argument("--check", action="store_true", help="nur prüfen ob die schnellen Varianten dasselbe Ergebnis liefern")
+    args = parser.parse_args()
+
+    if args.check:
+        checks = run_checks()
+        for name, mismatches in checks.items():
+            print("{:<32} {:6d} Abweichungen{}".format(name, mismatches, "  FEHLER" if mismatches else ""))
+        sys.exit(1 if any(checks.values()) else 0)
+
+    results = run_benchmarks(args.sizes, args.repeat)
+    if args.output:
+        save_json(results, args.output)
+    if args.save_baseline:
+        save_json(results, args.baseline)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    ratios, regressions = compare(results, baseline, args.tolerance) if baseline else ({}, [])
+    for name, value in sorted(results["timings"].items()):
+        line = "{:<32} {:12.6g}".format(name, value)
+        if name in ratios:
+            line += "  {:6.2f}x baseline{}".format(ratios[name], "  REGRESSION" if name in regressions else "")
+        print(line)
+    sys.exit(1 if regressions else 0)
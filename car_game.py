@@ -1,15 +1,29 @@
 """Ein 2D Auto lernt mit NEAT wie man eine Rennstrecke fährt"""
+import argparse
+import copy
+import functools
 import pickle
 import math
 import os
+import random
 import neat
-from shapely.geometry import LineString
+import numpy as np
 import pygame
+from checkpoint import CHECKPOINT_INTERVAL, CHECKPOINT_PREFIX, Checkpointer, latest_checkpoint
+from evaluation import (AGGREGATIONS, CACHE_SIZE, CachedEvaluator, Curriculum, FitnessCache, MultiTrackEvaluator,
+                        ParallelEvaluator, evaluate_genomes)
+from geometry import line_intersect
+from recording import load_log
+from replay import play, record
+from sensors import DEFAULT_SENSORS, cast_rays, load_config
+from simulation import SimulationSettings, rotate_offsets
+from telemetry import TelemetryReporter
+from track import Track, TrackRegistry
 
 WIN_WIDTH = 1280
 WIN_HEIGHT = 1024
 
-SCREEN = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+SCREEN = None #Wird erst von init_screen() erzeugt, damit headless kein Fenster braucht.
 CLOCK = pygame.time.Clock()
 FPS = 360 #Frames per second.
 
@@ -19,44 +33,34 @@ GREEN = (0, 255, 0)
 RED = (255, 0, 0)
 GREY = (100, 100, 100)
 
-OUTER_WALL_POINTS_LIST = pickle.load(open("Rennstrecke_Aussen.txt", "rb"))
-INNER_WALL_POINTS_LIST = pickle.load(open("Rennstrecke_Innen.txt", "rb"))
-FITNESS_POINTS_LIST = pickle.load(open("Fitnesslinien.txt", "rb"))
-START_POINT = pickle.load(open("Startpunkt.txt", "rb"))
+TRACK = Track.load("Rennstrecke.track") #Standard Strecke, alles andere bekommt seine Strecke übergeben
+
+BEST_CAR_LOG = "best_car.log" #Aufzeichnung der letzten Fahrt von main_one
 
 with open('best_car_genom.txt', 'rb') as f:
     BEST_CAR = pickle.load(f)
 
 class Car:
-    """Car"""
-    def __init__(self):
+    """Car, fährt auf track (ohne Angabe auf TRACK) und misst mit dem SensorRig sensors"""
+    def __init__(self, track=None, sensors=None):
+        self.track = TRACK if track is None else track
+        self.sensors = DEFAULT_SENSORS if sensors is None else sensors
         self.half_width = 10
         self.half_height = 20
-        self.detection_range = 8
-        self.center_pos = pygame.Vector2(START_POINT[0], START_POINT[1])
+        self.center_pos = pygame.Vector2(self.track.start_point[0], self.track.start_point[1])
         self.corner_top_left = pygame.Vector2(self.center_pos.x - self.half_width, self.center_pos.y - self.half_height)
         self.corner_top_right = pygame.Vector2(self.center_pos.x + self.half_width, self.center_pos.y - self.half_height)
         self.corner_bottom_left = pygame.Vector2(self.center_pos.x - self.half_width, self.center_pos.y + self.half_height)
         self.corner_bottom_right = pygame.Vector2(self.center_pos.x + self.half_width, self.center_pos.y + self.half_height)
         self.corner_list = [self.corner_top_left, self.corner_top_right, self.corner_bottom_right, self.corner_bottom_left]
         self.corner_rotated = self.corner_list[:]
+        self.previous_corners = self.corner_rotated[:]
 
-        self.top_left_detection_point = pygame.Vector2(self.center_pos.x - self.half_width * self.detection_range, self.center_pos.y - self.half_height * self.detection_range)
-        self.top_right_detection_point = pygame.Vector2(self.center_pos.x + self.half_width * self.detection_range, self.center_pos.y - self.half_height * self.detection_range)
-        self.top_detection_point = pygame.Vector2(self.center_pos.x, self.center_pos.y - self.half_height * self.detection_range)
-        self.detection_point_list = [self.top_left_detection_point, self.top_right_detection_point, self.top_detection_point]
-        self.detection_point_rotated = self.detection_point_list[:]
-
-        self.top_left_distance_point = self.top_left_detection_point
-        self.top_right_distance_point = self.top_right_detection_point
-        self.top_distance_point = self.top_detection_point
-        self.distance_point_list = [self.top_left_distance_point, self.top_right_distance_point, self.top_distance_point]
-
-        self.top_left_found = False
-        self.top_right_found = False
-        self.top_found = False
-
-        self.distance_list = [0, 0, 0]
+        self.detection_point_rotated = [self.center_pos + pygame.Vector2(*offset) for offset in self.sensors.offsets]
+        self.detection_point_list = self.detection_point_rotated
+        self.distance_point_list = self.detection_point_rotated[:]
+        self.found_list = [False] * self.sensors.num_inputs
+        self.distance_list = [0] * self.sensors.num_inputs
 
         self.velocity = pygame.Vector2(0, 0)
         self.color = GREEN
@@ -80,12 +84,17 @@ class Car:
             rotatedX = tempX*math.cos(self.radian) - tempY*math.sin(self.radian)
             rotatedY = tempX*math.sin(self.radian) + tempY*math.cos(self.radian)
 
-            x = int(rotatedX + self.center_pos.x)
-            y = int(rotatedY + self.center_pos.y)
+            x = rotatedX + self.center_pos.x
+            y = rotatedY + self.center_pos.y
             temp = pygame.Vector2(x, y)
             point_list[i] = temp
         return point_list
 
+    def rotate_detection_points(self):
+        """Endpunkte der Sensoren, die vorberechneten Offsets des SensorRig in einem Schritt gedreht"""
+        points = rotate_offsets(self.sensors.offsets, np.array([self.radian]))[0] + (self.center_pos.x, self.center_pos.y)
+        return [pygame.Vector2(*point) for point in points]
+
     def draw(self):
         """Zeichnet Rechteck vom Auto"""
         # if self.collision_with_wall():
@@ -113,21 +122,17 @@ class Car:
         self.corner_bottom_right = pygame.Vector2(self.center_pos.x + self.half_width, self.center_pos.y + self.half_height)
         self.corner_list = [self.corner_top_left, self.corner_top_right, self.corner_bottom_right, self.corner_bottom_left]
 
-        self.top_left_detection_point = pygame.Vector2(self.center_pos.x - self.half_width * self.detection_range, self.center_pos.y - self.half_height * self.detection_range)
-        self.top_right_detection_point = pygame.Vector2(self.center_pos.x + self.half_width * self.detection_range, self.center_pos.y - self.half_height * self.detection_range)
-        self.top_detection_point = pygame.Vector2(self.center_pos.x, self.center_pos.y - self.half_height * self.detection_range)
-        self.detection_point_list = [self.top_left_detection_point, self.top_right_detection_point, self.top_detection_point]
+        self.time_since_last_fitness += 1
+        self.previous_corners = self.corner_rotated
+        self.corner_rotated = self.rotate_points(self.corner_list)
+        self.detection_point_rotated = self.rotate_detection_points()
+        self.detection_point_list = self.detection_point_rotated
 
         self.calculate_distance_points()
-        self.distance_point_list = [self.top_left_distance_point, self.top_right_distance_point, self.top_distance_point]
 
         for i in range(0, len(self.distance_list)):
             self.distance_list[i] = math.sqrt(pow(abs(self.distance_point_list[i][0] - self.center_pos.x), 2) + pow(abs(self.distance_point_list[i][1] - self.center_pos.y), 2))
 
-        self.time_since_last_fitness += 1
-        self.corner_rotated = self.rotate_points(self.corner_list)
-        self.detection_point_rotated = self.rotate_points(self.detection_point_list)
-
     def accelerate(self):
         """Beschleunigung des Autos"""
         self.velocity.x += math.sin(self.radian) * self.acceleration
@@ -143,269 +148,215 @@ class Car:
         self.angular_velocity -= self.turn_speed
         self.angle -= self.turn_speed
 
-    def collision_with_wall(self):
-        """Gibt True zurück falls das Auto die Wand berührt"""
-        if self.time_since_last_fitness % 2 == 0:
-            return False
-
-        for i in range(0, len(OUTER_WALL_POINTS_LIST)-1):
-            if line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.corner_rotated[0], self.corner_rotated[1]):
-                return True
-            elif line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.corner_rotated[0], self.corner_rotated[3]):
-                return True
-            elif line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.corner_rotated[1], self.corner_rotated[2]):
-                return True
-            # elif line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.corner_rotated[2], self.corner_rotated[3]):
-            #     return True
+    def swept_segments(self):
+        """Die vier Kanten des Autos und die Wege der vier Ecken seit dem letzten Frame, als (Anfang, Ende) Paare"""
+        corners = self.corner_rotated
+        edges = [(corners[i], corners[(i + 1) % 4]) for i in range(4)]
+        return edges + list(zip(self.previous_corners, corners))
 
-        for i in range(0, len(INNER_WALL_POINTS_LIST)-1):
-            if line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.corner_rotated[0], self.corner_rotated[1]):
-                return True
-            elif line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.corner_rotated[0], self.corner_rotated[3]):
-                return True
-            elif line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.corner_rotated[1], self.corner_rotated[2]):
-                return True
-            # elif line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.corner_rotated[2], self.corner_rotated[3]):
-            #     return True
-            
-        return False
+    def collision_with_wall(self):
+        """Gibt True zurück falls das Auto seit dem letzten Frame die Wand berührt hat"""
+        starts, ends = zip(*self.swept_segments())
+        return bool(self.track.grid.any_intersection(starts, ends).any())
 
     def collision_with_fitness_line(self):
-        """Prüft ob das Auto die Fitness Linie berührt"""
-        if line_intersect(FITNESS_POINTS_LIST[self.next_fitness], FITNESS_POINTS_LIST[self.next_fitness+1], self.corner_rotated[0], self.corner_rotated[1]):
-            self.next_fitness += 2
-            if self.next_fitness == len(FITNESS_POINTS_LIST):
-                self.next_fitness = 0
-            return True
-        elif line_intersect(FITNESS_POINTS_LIST[self.next_fitness], FITNESS_POINTS_LIST[self.next_fitness+1], self.corner_rotated[0], self.corner_rotated[3]):
-            self.next_fitness += 2
-            if self.next_fitness == len(FITNESS_POINTS_LIST):
-                self.next_fitness = 0
-            return True
-        elif line_intersect(FITNESS_POINTS_LIST[self.next_fitness], FITNESS_POINTS_LIST[self.next_fitness+1], self.corner_rotated[1], self.corner_rotated[2]):
-            self.next_fitness += 2
-            if self.next_fitness == len(FITNESS_POINTS_LIST):
-                self.next_fitness = 0
-            return True
-        # elif line_intersect(FITNESS_POINTS_LIST[self.next_fitness], FITNESS_POINTS_LIST[self.next_fitness+1], self.corner_rotated[2], self.corner_rotated[3]):
-        #     self.next_fitness += 2
-        #     if self.next_fitness == len(FITNESS_POINTS_LIST):
-        #         self.next_fitness = 0
-        #     return True
+        """Prüft ob das Auto seit dem letzten Frame die Fitness Linie berührt hat"""
+        fitness_points = self.track.fitness_lines
+        for start, end in self.swept_segments():
+            if line_intersect(fitness_points[self.next_fitness], fitness_points[self.next_fitness+1], start, end):
+                self.next_fitness += 2
+                if self.next_fitness == len(fitness_points):
+                    self.next_fitness = 0
+                return True
         return False
 
     def calculate_distance_points(self):
-        self.top_left_distance_point = self.detection_point_rotated[0]
-        self.top_right_distance_point = self.detection_point_rotated[1]
-        self.top_distance_point = self.detection_point_rotated[2]
-
-        self.top_left_found = False
-        self.top_right_found = False
-        self.top_found = False
-
-
-        for i in range(0, len(OUTER_WALL_POINTS_LIST)-1):
-            if not self.top_left_found:
-                if line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.center_pos, self.detection_point_rotated[0]):
-                    self.top_left_distance_point = line_intersection_point((OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1]), (self.center_pos, self.detection_point_rotated[0]))
-                    self.top_left_found = True
-
-            if not self.top_right_found:
-                if line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.center_pos, self.detection_point_rotated[1]):
-                    self.top_right_distance_point = line_intersection_point((OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1]), (self.center_pos, self.detection_point_rotated[1]))
-                    self.top_right_found = True
-
-            if not self.top_found:
-                if line_intersect(OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1], self.center_pos, self.detection_point_rotated[2]):
-                    self.top_distance_point = line_intersection_point((OUTER_WALL_POINTS_LIST[i], OUTER_WALL_POINTS_LIST[i+1]), (self.center_pos, self.detection_point_rotated[2]))
-                    self.top_found = True
-        
-
-    
-        for i in range(0, len(INNER_WALL_POINTS_LIST)-1):
-            if not self.top_left_found:
-                if line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.center_pos, self.detection_point_rotated[0]):
-                    self.top_left_distance_point = line_intersection_point((INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1]), (self.center_pos, self.detection_point_rotated[0]))
-                    self.top_left_found = True
-
-            if not self.top_right_found:
-                if line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.center_pos, self.detection_point_rotated[1]):
-                    self.top_right_distance_point = line_intersection_point((INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1]), (self.center_pos, self.detection_point_rotated[1]))
-                    self.top_right_found = True
-
-            if not self.top_found:
-                if line_intersect(INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1], self.center_pos, self.detection_point_rotated[2]):
-                    self.top_distance_point = line_intersection_point((INNER_WALL_POINTS_LIST[i], INNER_WALL_POINTS_LIST[i+1]), (self.center_pos, self.detection_point_rotated[2]))
-                    self.top_found = True
-
-
-
-
-def line_intersect(p1, p2, p3, p4):
-    line = LineString([p1, p2])
-    other = LineString([p3, p4])
-    if line.intersects(other):
-        return True
-    else:
-        return False
-
-
-def line_intersection_point(line1, line2):
-    """Nimmt (A, B), (C, D) als Argument, diese sind 4 Punkte und gibt zurück ob sich die Linien die durch diese Punkte entstanden sind sich kreuzen oder nicht"""
-    xdiff = (line1[0][0] - line1[1][0], line2[0][0] - line2[1][0])
-    ydiff = (line1[0][1] - line1[1][1], line2[0][1] - line2[1][1])
-
-    def det(a, b):
-        """determinante berechnen"""
-        return a[0] * b[1] - a[1] * b[0]
+        """Nächster Treffpunkt jedes Sensors mit der Wand"""
+        points, _, found = cast_rays([self.center_pos], [self.detection_point_rotated], self.track.grid)
+        self.distance_point_list = [pygame.Vector2(*p) for p in points[0]]
+        self.found_list = found[0].tolist()
 
-    div = det(xdiff, ydiff)
-
-    d = (det(*line1), det(*line2))
-    x = det(d, xdiff) / div
-    y = det(d, ydiff) / div
-    return x, y
 
 def draw_on_screen(car):
     """Zeichnet die Rennstrecke, ohne Fitnesslinien und Startpunkt"""
-    pygame.draw.lines(SCREEN, WHITE, False, OUTER_WALL_POINTS_LIST)
-    pygame.draw.lines(SCREEN, WHITE, False, INNER_WALL_POINTS_LIST)
+    pygame.draw.lines(SCREEN, WHITE, False, car.track.outer_wall)
+    pygame.draw.lines(SCREEN, WHITE, False, car.track.inner_wall)
     car.draw()
 
     #Zeichnet Fitnesslinie und Startpunkt
     #pygame.draw.line(SCREEN, WHITE, FITNESS_POINTS_LIST[car.next_fitness], FITNESS_POINTS_LIST[car.next_fitness+1])
     #pygame.draw.circle(SCREEN, WHITE, START_POINT, 5)
 
-def move_draw(car):
-    car.move()
-    draw_on_screen(car)
+def init_screen():
+    """Öffnet das Fenster, nur nötig wenn gezeichnet wird"""
+    global SCREEN
+    if SCREEN is None:
+        SCREEN = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+    return SCREEN
 
-#random genom wird genommen und viele Autos werden erzeugt:
-def main(genomes, config):
-    """main function"""
-    cars = []
-    genom = []
-    nets = []
-
-    for _, g in genomes:
-        net = neat.nn.FeedForwardNetwork.create(g, config)
-        nets.append(net)
-        cars.append(Car())
-        g.fitness = 0
-        genom.append(g)
 
-    running = True
-    while running:
-        CLOCK.tick(FPS)
-        SCREEN.fill(GREY)
+class ScreenRenderer:
+    """Optionaler Beobachter der Simulation, zeichnet jeden Frame in ein Fenster"""
+    def __init__(self, fps=FPS):
+        self.fps = fps
+        init_screen()
 
+    def begin_frame(self):
+        """Frame Takt, Events und Hintergrund"""
+        CLOCK.tick(self.fps)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False
                 pygame.quit()
                 quit()
+        SCREEN.fill(GREY)
 
+    def draw_car(self, car):
+        """Zeichnet ein Auto samt Rennstrecke"""
+        draw_on_screen(car)
+
+    def draw_population(self, population):
+        """Zeichnet die Rennstrecke und alle lebenden Autos der Population"""
+        pygame.draw.lines(SCREEN, WHITE, False, population.track.outer_wall)
+        pygame.draw.lines(SCREEN, WHITE, False, population.track.inner_wall)
+        for x in range(population.count):
+            center = population.center_pos[x]
+            pygame.draw.lines(SCREEN, GREEN, True, population.corner_rotated[x].tolist())
+            for point in population.detection_point_rotated[x]:
+                pygame.draw.line(SCREEN, GREEN, point, center)
+            for distance in population.distance_points[x]:
+                pygame.draw.circle(SCREEN, GREEN, (int(distance[0]), int(distance[1])), 5)
+
+    def end_frame(self):
+        """Zeigt den fertigen Frame an"""
+        pygame.display.update()
 
-        for x, car in enumerate(cars):
-            if car.collision_with_wall() or car.time_since_last_fitness > 100:
-                genom[x].fitness -= 5
-                cars.pop(x)
-                nets.pop(x)
-                genom.pop(x)
-
-            elif car.collision_with_fitness_line():
-                genom[x].fitness += 10
-                car.time_since_last_fitness = 0
-                car.fitness += 10
-
-            if car.fitness >= 6000:
-                running = False
-            move_draw(car)
 
+#random genom wird genommen und viele Autos werden erzeugt:
+def simulate(genomes, config, renderer=None, settings=None):
+    """Simuliert eine Generation, ohne renderer läuft alles ohne Fenster und ohne Frame Limit"""
+    evaluate_genomes(genomes, config, TRACK, renderer, settings)
 
-        if not cars:
-            running = False
-            break
 
-        for x, car in enumerate(cars):
-            output = nets[x].activate((car.distance_list[0], car.distance_list[1], car.distance_list[2]))
-            if output[0] > 0.5:
-                car.accelerate()
-            if output[1] > 0.2:
-                car.rotate_right()
-            if output[2] > 0.2:
-                car.rotate_left()
+def main(genomes, config):
+    """main function, mit Fenster"""
+    simulate(genomes, config, ScreenRenderer())
 
 
-        pygame.display.update()
+def main_headless(genomes, config):
+    """main function, ohne Fenster und so schnell wie möglich"""
+    simulate(genomes, config)
 
 #winner genom wird genommen und nur der gewinner wird laufen:
 def main_one(genomes, config):
-    """main function"""
-    car = Car()
+    """main function, BEST_CAR fährt mit derselben Simulation wie im Training, ohne Fenster aufgezeichnet und danach abgespielt"""
     genom = 0
-    net = neat.nn.FeedForwardNetwork.create(BEST_CAR, config)
     for _, g in genomes:
         g.fitness = 0
         genom = g
 
-    
-    running = True
-    while running:
-        CLOCK.tick(FPS)
-        SCREEN.fill(GREY)
-
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-                pygame.quit()
-                quit()
-
-
-        if car.collision_with_wall() or car.time_since_last_fitness > 100:
-            genom.fitness -= 5
-            running = False
-            break
-
-        if car.collision_with_fitness_line():
-            genom.fitness += 10
-            car.time_since_last_fitness = 0
-            car.fitness += 10
-
-
-        if car.fitness >= 4000:
-            running = False
-            break
-
-        move_draw(car)
-
-        output = net.activate((car.distance_list[0], car.distance_list[1], car.distance_list[2]))
-        if output[0] > 0.5:
-            car.accelerate()
-        if output[1] > 0.2:
-            car.rotate_right()
-        if output[2] > 0.2:
-            car.rotate_left()
-
-
-        pygame.display.update()
-
-
-def run(config_file):
-    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
-                                neat.DefaultStagnation, config_file)
-    p = neat.Population(config)
+    genom.fitness = record(BEST_CAR_LOG, [BEST_CAR], config, TRACK, SimulationSettings(fitness_limit=4000, sensors=getattr(config, "sensors", None)))[0]
+    play(load_log(BEST_CAR_LOG)[0], fps=FPS)
+
+
+def run(config_file, headless=False, generations=5000, workers=None, seed=None, settings=None,
+        cache_size=CACHE_SIZE, cache_file=None, telemetry_file=None,
+        checkpoint_interval=CHECKPOINT_INTERVAL, checkpoint_prefix=CHECKPOINT_PREFIX, resume=None,
+        tracks=None, curriculum=None, aggregate="mean"):
+    """Trainiert mit NEAT, headless=True simuliert ohne Fenster, workers verteilt die Genome auf mehrere Prozesse.
+    Mit seed ist der ganze Lauf reproduzierbar, settings sind die SimulationSettings, ihre Sensoren kommen aus der Config.
+    Schon bewertete Genome kommen aus einem Cache mit cache_size Einträgen (0 schaltet ihn ab), optional in cache_file.
+    Mit telemetry_file werden Zeiten und Durchsatz jeder Generation dort als CSV oder JSON-lines gespeichert.
+    Alle checkpoint_interval Generationen entsteht ein Checkpoint (None oder 0 schaltet sie ab), resume setzt einen
+    Lauf aus dieser Datei fort, "latest" nimmt den neuesten Checkpoint mit checkpoint_prefix. generations zählt ab Generation 0.
+    tracks ist eine Liste von .track Dateien, jedes Genom fährt dann auf allen (oder denen aus curriculum, einem Curriculum)
+    und bekommt die mit aggregate zusammengefasste Fitness."""
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    if resume == "latest":
+        resume = latest_checkpoint(checkpoint_prefix)
+        if resume is None:
+            raise FileNotFoundError("Kein Checkpoint {}* zum Fortsetzen gefunden".format(checkpoint_prefix))
+    if resume:
+        p, stats = Checkpointer.restore(resume)
+        stats = stats or neat.StatisticsReporter()
+        print("Resuming from {} at generation {}".format(resume, p.generation))
+    else:
+        config = load_config(config_file)
+        p = neat.Population(config)
+        stats = neat.StatisticsReporter()
     p.add_reporter((neat.StdOutReporter(True)))
-    stats = neat.StatisticsReporter()
     p.add_reporter(stats)
-
-    winner = p.run(main, 5000)
+    if telemetry_file:
+        p.add_reporter(TelemetryReporter(telemetry_file))
+    if checkpoint_interval:
+        checkpointer = Checkpointer(checkpoint_interval, filename_prefix=checkpoint_prefix, stats=stats)
+        checkpointer.last_generation_checkpoint = p.generation - 1
+        p.add_reporter(checkpointer)
+    settings = copy.copy(settings or SimulationSettings())
+    settings.sensors = getattr(p.config, "sensors", None) or settings.sensors
+
+    parallel = None
+    if tracks:
+        registry = TrackRegistry.load(tracks)
+        parallel = ParallelEvaluator(workers, registry, settings) if workers else None
+        renderer = None if headless or workers else ScreenRenderer()
+        evaluator = MultiTrackEvaluator(registry, curriculum, aggregate, settings, parallel, renderer)
+        p.add_reporter(evaluator)
+        fitness_function = evaluator.evaluate
+        track = evaluator
+    elif workers:
+        parallel = ParallelEvaluator(workers, TRACK, settings)
+        fitness_function = parallel.evaluate
+        track = TRACK
+    else:
+        renderer = None if headless else ScreenRenderer()
+        fitness_function = functools.partial(simulate, renderer=renderer, settings=settings)
+        track = TRACK
+    if cache_size:
+        fitness_function = CachedEvaluator(fitness_function, FitnessCache(cache_size, cache_file), track, settings).evaluate
+
+    try:
+        winner = p.run(fitness_function, max(generations - p.generation, 0))
+    finally:
+        if parallel is not None:
+            parallel.close()
     print(winner)
-    pickle.dump(winner, open("best_car_genom.txt", "wb"))
+    if winner is not None:
+        pickle.dump(winner, open("best_car_genom.txt", "wb"))
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headless", action="store_true", help="ohne Fenster und ohne Frame Limit trainieren")
+    parser.add_argument("--generations", type=int, default=5000)
+    parser.add_argument("--workers", type=int, help="Anzahl Prozesse, bewertet headless und parallel")
+    parser.add_argument("--seed", type=int, help="Zufallszahlen festlegen, damit der Lauf reproduzierbar ist")
+    parser.add_argument("--dt", type=float, default=1.0, help="fester Zeitschritt der Simulation in Frames")
+    parser.add_argument("--max-steps", type=int, help="höchstens so viele Schritte pro Generation")
+    parser.add_argument("--early-termination", action="store_true",
+                        help="Autos beenden, die ihr nächstes Tor sicher nicht mehr erreichen")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Einträge im Fitness Cache, 0 schaltet ihn ab")
+    parser.add_argument("--cache-file", help="Fitness Cache in dieser Datei speichern und wieder laden")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL,
+                        help="alle so viele Generationen einen Checkpoint schreiben, 0 schaltet sie ab")
+    parser.add_argument("--checkpoint-prefix", default=CHECKPOINT_PREFIX, help="Anfang der Dateinamen der Checkpoints")
+    parser.add_argument("--resume", nargs="?", const="latest", help="Lauf aus diesem Checkpoint fortsetzen, ohne Datei den neuesten")
+    parser.add_argument("--tracks", nargs="+", help="auf allen diesen .track Dateien bewerten, Name ist der Dateiname")
+    parser.add_argument("--curriculum", type=Curriculum.parse,
+                        help='welche Strecken ab welcher Generation, z.B. "0:Oval;50:Oval,Rennstrecke"')
+    parser.add_argument("--aggregate", choices=sorted(AGGREGATIONS),
+                        help="wie die Fitness der einzelnen Strecken zusammengefasst wird, ohne Angabe mean")
+    parser.add_argument("--telemetry", help="Zeiten pro Generation in diese Datei schreiben, .csv oder JSON-lines")
+    args = parser.parse_args()
+    if not args.tracks and (args.curriculum or args.aggregate):
+        parser.error("--curriculum und --aggregate gehen nur zusammen mit --tracks")
+    settings = SimulationSettings(dt=args.dt, max_steps=args.max_steps, early_termination=args.early_termination)
+
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, "config-feedforward.txt")
-    run(config_path)
+    run(config_path, headless=args.headless, generations=args.generations, workers=args.workers,
+        seed=args.seed, settings=settings, cache_size=args.cache_size, cache_file=args.cache_file,
+        telemetry_file=args.telemetry, checkpoint_interval=args.checkpoint_interval,
+        checkpoint_prefix=args.checkpoint_prefix, resume=args.resume, tracks=args.tracks, curriculum=args.curriculum,
+        aggregate=args.aggregate or "mean")
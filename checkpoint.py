@@ -0,0 +1,90 @@
+"""Checkpoints für lange Trainingsläufe: Population, Spezies, Statistik und Zufallszahlen, atomar geschrieben"""
+import glob
+import itertools
+import os
+import pickle
+import random
+import time
+import neat
+import numpy as np
+
+CHECKPOINT_PREFIX = "neat-checkpoint-"
+CHECKPOINT_INTERVAL = 10 #Generationen zwischen zwei Checkpoints
+CHECKPOINT_KEEP = 3 #So viele der letzten Checkpoints bleiben liegen
+
+
+class Checkpointer(neat.Checkpointer):
+    """neat.Checkpointer, der zusätzlich den StatisticsReporter und den Zustand von random und NumPy speichert.
+    Die Datei entsteht erst unter einem temporären Namen und wird dann umbenannt, ein Absturz beim Schreiben
+    lässt also immer den letzten vollständigen Checkpoint zurück. Sie ist nicht komprimiert, damit das Laden schnell geht.
+    Der Name enthält die Generation mit der es weitergeht. Von den Dateien, die dieser Checkpointer selbst geschrieben hat,
+    bleiben nur die letzten keep liegen, Checkpoints anderer Läufe mit demselben prefix werden nie gelöscht."""
+    def __init__(self, generation_interval=CHECKPOINT_INTERVAL, time_interval_seconds=None,
+                 filename_prefix=CHECKPOINT_PREFIX, stats=None, keep=CHECKPOINT_KEEP):
+        super().__init__(generation_interval, time_interval_seconds, filename_prefix)
+        self.stats = stats
+        self.keep = keep
+        self.written = []
+
+    def save_checkpoint(self, config, population, species_set, generation):
+        """Speichert den Zustand am Ende von generation, population ist schon die nächste Generation"""
+        filename = "{}{}".format(self.filename_prefix, generation + 1)
+        data = {"generation": generation + 1,
+                "config": config,
+                "population": population,
+                "species_set": species_set,
+                "stats": self.stats,
+                "random_state": random.getstate(),
+                "numpy_state": np.random.get_state(),
+                "time": time.time()}
+        temp_path = filename + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, filename)
+        print("Saving checkpoint to {0}".format(filename))
+
+        if filename not in self.written:
+            self.written.append(filename)
+        if self.keep:
+            while len(self.written) > self.keep:
+                old = self.written.pop(0)
+                if os.path.exists(old):
+                    os.remove(old)
+
+    @staticmethod
+    def restore(filename):
+        """Lädt einen Checkpoint, setzt random und NumPy zurück und gibt (neat.Population, StatisticsReporter oder None) zurück.
+        Heißt nicht restore_checkpoint, weil neat.Checkpointer.restore_checkpoint nur die Population zurückgibt.
+        Reporter werden nicht mitgeladen, der StatisticsReporter muss wieder mit add_reporter angemeldet werden."""
+        with open(filename, "rb") as f:
+            data = pickle.load(f)
+        random.setstate(data["random_state"])
+        np.random.set_state(data["numpy_state"])
+        population = neat.Population(data["config"], (data["population"], data["species_set"], data["generation"]))
+        #Die neue Reproduktion würde wieder bei Genom 1 anfangen zu zählen
+        population.reproduction.genome_indexer = itertools.count(max(data["population"]) + 1)
+        stats = data["stats"]
+        if stats is not None and stats.most_fit_genomes:
+            population.best_genome = stats.best_genome()
+        return population, stats
+
+    @staticmethod
+    def restore_checkpoint(filename):
+        """Wie bei neat.Checkpointer nur die neat.Population, damit Aufrufer der neat API auch diese Dateien laden können"""
+        return Checkpointer.restore(filename)[0]
+
+
+def list_checkpoints(prefix=CHECKPOINT_PREFIX):
+    """Alle Checkpoints mit prefix, sortiert nach Generation"""
+    checkpoints = []
+    for path in glob.glob(glob.escape(prefix) + "*"):
+        suffix = path[len(prefix):]
+        if suffix.isdigit():
+            checkpoints.append((int(suffix), path))
+    return [path for _, path in sorted(checkpoints)]
+
+
+def latest_checkpoint(prefix=CHECKPOINT_PREFIX):
+    """Pfad des neuesten Checkpoints oder None"""
+    checkpoints = list_checkpoints(prefix)
+    return checkpoints[-1] if checkpoints else None
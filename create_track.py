@@ -1,15 +1,34 @@
-"""Hier wird mit der Maus, Linien gezeichnet um einen Rennstrecke für das 2D Auto zu erstellen"""
+"""Hier wird mit der Maus, Linien gezeichnet um einen Rennstrecke für das 2D Auto zu erstellen.
+
+Ohne Fenster lassen sich Strecken auch aus Dateien bauen: die Wände werden mit Douglas-Peucker vereinfacht,
+geprüft (geschlossen, ohne Schnitte, Innenwand in der Außenwand, Start dazwischen), bekommen gleichmäßig
+verteilte Fitnesslinien und werden als kompilierte .track Datei geschrieben.
+
+python create_track.py
+python create_track.py draw -o meine_strecke.track
+python create_track.py build --outer aussen.csv --inner innen.csv --start 122,522 -o strecke.track
+python create_track.py batch strecken.json -o tracks
+
+Das Manifest für batch ist eine JSON Liste mit einem Eintrag pro Strecke:
+{"name": "oval", "outer": "oval_aussen.csv", "inner": "oval_innen.csv", "start": [122, 522], "tolerance": 2}
+Dazu optional "fitness", "gate_spacing" und "close", Pfade sind relativ zum Manifest.
+"""
+import argparse
+import json
+import os
 import pickle
+import sys
+import numpy as np
 import pygame
-
-pygame.font.init()
+from geometry import closest_points, point_in_polygon, polyline_segments, segment_intersections, simplify_polyline
+from track import GRID_CELL_SIZE, Track, convert_pickle_track
 
 WIN_WIDTH = 1280
 WIN_HEIGHT = 1024
 
-STAT_FONT = pygame.font.SysFont("arial", 40)
-SCREEN = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
-CLOCK = pygame.time.Clock()
+STAT_FONT = None #Schrift, Fenster und Takt erzeugt erst main(), build und batch brauchen kein pygame
+SCREEN = None
+CLOCK = None
 FPS = 60 #Frames per second.
 
 BLACK = (0, 0, 0)
@@ -17,19 +36,39 @@ WHITE = (255, 255, 255)
 GREEN = (0, 255, 0)
 GREY = (100, 100, 100)
 
+TOLERANCE = 2.0 #Pixel, so weit darf die vereinfachte Wand von den geklickten Punkten abweichen
+GATE_SPACING = 140.0 #Pixel entlang der Außenwand zwischen zwei Fitnesslinien
+FORWARD = np.array([0.0, -1.0]) #Richtung in die das Auto am Start schaut (radian 0)
+EDITOR_OUTPUT = "Neue_Rennstrecke.track" #Hierhin schreibt C, die mitgelieferte Rennstrecke.track bleibt unberührt
+
 WALL_POINTS_LIST = []
 FITNESS_POINTS_LIST = []
 
 
 def text_on_screen():
     """Writes all the Text on Screen"""
-    text = STAT_FONT.render("Wall(W) and close line(F), Startpoint(S), Fitnessline(L)", True, BLACK)
+    text = STAT_FONT.render("Wall(W) and close line(F), Startpoint(S), Fitnessline(L), Compile(C)", True, BLACK)
     height_of_text = 0
     SCREEN.blit(text, (0, height_of_text))
 
 
-def main():
-    """main function"""
+def compile_track(output):
+    """Kompiliert die gezeichneten Pickle Dateien nach output, fehlt eine davon wird das nur gemeldet"""
+    try:
+        convert_pickle_track(output)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError) as error:
+        print("Strecke nicht kompiliert: {}".format(error))
+        return
+    print("Strecke nach {} geschrieben".format(output))
+
+
+def main(output=EDITOR_OUTPUT):
+    """main function, C kompiliert die Strecke nach output"""
+    global STAT_FONT, SCREEN, CLOCK
+    pygame.font.init()
+    STAT_FONT = pygame.font.SysFont("arial", 40)
+    SCREEN = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+    CLOCK = pygame.time.Clock()
     mode = "WALL"
     wall_nr = 0
 
@@ -51,6 +90,8 @@ def main():
                     mode = "START"
                 elif event.key == pygame.K_l:
                     mode = "FITNESS"
+                elif event.key == pygame.K_c:
+                    compile_track(output)
 
             if mode == "WALL":
                 if event.type == pygame.KEYDOWN:
@@ -96,5 +137,209 @@ def main():
         pygame.display.update()
 
 
+def load_polyline(path):
+    """Lädt Punkte (N, 2) aus einer Pickle Datei von main(), einer JSON Liste oder einer Textdatei mit "x y" oder "x,y" pro Zeile"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(b"\x80"):
+        points = pickle.loads(data)
+    elif path.endswith(".json"):
+        points = json.loads(data)
+    else:
+        points = [line.replace(",", " ").split() for line in data.decode().splitlines()]
+        points = [line for line in points if line and not line[0].startswith("#")]
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    #Doppelte Punkte hintereinander ergäben Wandstücke der Länge 0
+    keep = np.concatenate(([True], (points[1:] != points[:-1]).any(axis=1)))
+    return points[keep]
+
+
+def load_point(value):
+    """Startpunkt aus "x,y" oder einer Pickle Datei wie Startpunkt.txt"""
+    if isinstance(value, str) and not os.path.exists(value):
+        value = value.split(",")
+    elif isinstance(value, str):
+        with open(value, "rb") as f:
+            value = pickle.load(f)
+    return np.asarray(value, dtype=float).reshape(2)
+
+
+def close_polyline(points):
+    """Hängt den ersten Punkt hinten an, falls der Linienzug noch offen ist"""
+    if np.array_equal(points[0], points[-1]):
+        return points
+    return np.concatenate((points, points[:1]))
+
+
+def wall_crossings(walls):
+    """Alle Paare von Wandstücken (i, j) die sich schneiden, über alle Wände hinweg.
+    Nachbarn in derselben Wand teilen sich einen Punkt und zählen nicht."""
+    segments = np.concatenate([polyline_segments(wall) for wall in walls])
+    wall_index = np.concatenate([np.full(len(wall) - 1, n) for n, wall in enumerate(walls)])
+    first = np.cumsum([0] + [len(wall) - 1 for wall in walls[:-1]])
+    last = first + [len(wall) - 2 for wall in walls]
+
+    hit, _ = segment_intersections(segments[:, None, 0], segments[:, None, 1], segments[None, :, 0], segments[None, :, 1])
+    i, j = np.nonzero(np.triu(hit, 1))
+    same_wall = wall_index[i] == wall_index[j]
+    neighbours = same_wall & ((j == i + 1) | ((i == first[wall_index[i]]) & (j == last[wall_index[j]])))
+    return list(zip(i[~neighbours].tolist(), j[~neighbours].tolist()))
+
+
+def validate_walls(outer, inner, start):
+    """Prüft eine Strecke, wirft ValueError mit allen gefundenen Fehlern"""
+    errors = []
+    for name, wall in (("Außenwand", outer), ("Innenwand", inner)):
+        if len(wall) < 4:
+            errors.append("{} hat nur {} Punkte".format(name, len(wall)))
+        elif not np.array_equal(wall[0], wall[-1]):
+            errors.append("{} ist nicht geschlossen".format(name))
+    if errors:
+        raise ValueError(", ".join(errors))
+
+    crossings = wall_crossings([outer, inner])
+    if crossings:
+        errors.append("{} Schnitte zwischen Wandstücken, z.B. {} und {}".format(len(crossings), *crossings[0]))
+    if not point_in_polygon(inner, outer).all():
+        errors.append("Innenwand liegt nicht ganz in der Außenwand")
+    if not point_in_polygon(start, outer) or point_in_polygon(start, inner):
+        errors.append("Startpunkt liegt nicht zwischen den Wänden")
+    if errors:
+        raise ValueError(", ".join(errors))
+
+
+def generate_gates(outer, inner, start, spacing=GATE_SPACING):
+    """Fitnesslinien (G*2, 2) im Abstand spacing entlang der Außenwand, jede zum nächsten Punkt der Innenwand.
+    Die erste liegt einen halben Abstand vor dem Start, die Reihenfolge folgt der Richtung in die das Auto startet.
+    Linien die eine andere Wand schneiden fallen weg."""
+    segments = polyline_segments(outer)
+    lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+    position = np.concatenate(([0.0], np.cumsum(lengths)))
+    perimeter = position[-1]
+
+    #Stelle des Starts auf der Außenwand und die Fahrtrichtung dort
+    nearest = closest_points(start, segments[:, 0], segments[:, 1])
+    k = int(np.argmin(np.hypot(*(nearest - start).T)))
+    start_position = position[k] + np.hypot(*(nearest[k] - segments[k, 0]))
+    direction = 1.0 if np.dot(segments[k, 1] - segments[k, 0], FORWARD) >= 0 else -1.0
+
+    count = max(int(perimeter // spacing), 1)
+    distances = (start_position + direction * (np.arange(count) + 0.5) * perimeter / count) % perimeter
+    k = np.clip(np.searchsorted(position, distances, side="right") - 1, 0, len(segments) - 1)
+    t = (distances - position[k]) / np.where(lengths[k] > 0, lengths[k], 1)
+    outer_points = segments[k, 0] + t[:, None] * (segments[k, 1] - segments[k, 0])
+
+    inner_segments = polyline_segments(inner)
+    candidates = closest_points(outer_points[:, None], inner_segments[:, 0], inner_segments[:, 1])
+    nearest = np.argmin(np.hypot(*np.moveaxis(candidates - outer_points[:, None], -1, 0)), axis=1)
+    inner_points = candidates[np.arange(count), nearest]
+
+    #Nur das Innere der Linie prüfen, die Enden liegen auf den Wänden
+    walls = np.concatenate((segments, inner_segments))
+    shrink = 1e-3 * (inner_points - outer_points)
+    hit, _ = segment_intersections((outer_points + shrink)[:, None], (inner_points - shrink)[:, None], walls[:, 0], walls[:, 1])
+    keep = ~hit.any(axis=1)
+    if keep.sum() < 2:
+        raise ValueError("nur {} gültige Fitnesslinien, gate_spacing ist zu groß oder die Strecke zu eng".format(keep.sum()))
+    return np.stack((outer_points[keep], inner_points[keep]), axis=1).reshape(-1, 2)
+
+
+def build_track(outer, inner, start, fitness_lines=None, tolerance=TOLERANCE, gate_spacing=GATE_SPACING,
+                close=False, cell_size=GRID_CELL_SIZE):
+    """Vereinfacht und prüft die Wände und baut daraus eine Track.
+    Ohne fitness_lines werden die Fitnesslinien mit generate_gates erzeugt, close schließt offene Wände."""
+    walls = []
+    for wall in (outer, inner):
+        wall = np.asarray(wall, dtype=float)
+        if close:
+            wall = close_polyline(wall)
+        walls.append(simplify_polyline(wall, tolerance) if tolerance else wall)
+    outer, inner = walls
+    start = np.asarray(start, dtype=float).reshape(2)
+    validate_walls(outer, inner, start)
+    if fitness_lines is None:
+        fitness_lines = generate_gates(outer, inner, start, gate_spacing)
+    return Track(outer, inner, fitness_lines, start, cell_size)
+
+
+def build_file(output, outer_file, inner_file, start, fitness_file=None, **options):
+    """Baut eine Strecke aus Dateien und schreibt sie nach output.
+    Gibt die Track und die Anzahl Wandstücke vor und nach dem Vereinfachen zurück."""
+    outer = load_polyline(outer_file)
+    inner = load_polyline(inner_file)
+    if options.get("close"):
+        #Die Schließstücke zählen schon vor dem Vereinfachen mit
+        outer, inner = close_polyline(outer), close_polyline(inner)
+    fitness_lines = load_polyline(fitness_file) if fitness_file else None
+    track = build_track(outer, inner, load_point(start), fitness_lines, **options)
+    track.save(output)
+    return track, len(outer) + len(inner) - 2, len(track.walls)
+
+
+def build_batch(manifest, output_dir=".", **defaults):
+    """Baut alle Strecken aus einem Manifest, eine fehlerhafte Strecke hält die anderen nicht auf.
+    defaults gelten für Einträge ohne eigene Werte (tolerance, gate_spacing, close). Gibt eine Liste (Name, Fehler oder None) zurück."""
+    with open(manifest) as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest))
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    for entry in entries:
+        entry = dict(defaults, **entry)
+        name = entry.pop("name")
+        files = {key: os.path.join(base, entry.pop(key)) for key in ("outer", "inner", "fitness") if key in entry}
+        start = entry.pop("start")
+        if isinstance(start, str):
+            start = os.path.join(base, start) if os.path.exists(os.path.join(base, start)) else start
+        output = os.path.join(output_dir, name + ".track")
+        try:
+            track, before, after = build_file(output, files["outer"], files["inner"], start, files.get("fitness"), **entry)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            print("{:<20} Fehler: {}".format(name, error))
+            results.append((name, str(error)))
+            continue
+        print("{:<20} {} -> {} Wandstücke, {} Fitnesslinien, {}".format(name, before, after, len(track.gates), output))
+        results.append((name, None))
+    return results
+
+
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) == 1:
+        main()
+        sys.exit()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    draw_parser = commands.add_parser("draw", help="Strecke mit der Maus zeichnen, C kompiliert sie")
+    draw_parser.add_argument("-o", "--output", default=EDITOR_OUTPUT)
+
+    build_parser = commands.add_parser("build", help="eine Strecke aus Dateien bauen")
+    build_parser.add_argument("--outer", required=True, help="Punkte der Außenwand")
+    build_parser.add_argument("--inner", required=True, help="Punkte der Innenwand")
+    build_parser.add_argument("--start", required=True, help="x,y oder eine Pickle Datei wie Startpunkt.txt")
+    build_parser.add_argument("--fitness", help="eigene Fitnesslinien statt der erzeugten")
+    build_parser.add_argument("-o", "--output", default=EDITOR_OUTPUT)
+
+    batch_parser = commands.add_parser("batch", help="alle Strecken aus einem JSON Manifest bauen")
+    batch_parser.add_argument("manifest")
+    batch_parser.add_argument("-o", "--output-dir", default=".")
+
+    for sub_parser in (build_parser, batch_parser):
+        sub_parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Douglas-Peucker Toleranz in Pixeln, 0 = aus")
+        sub_parser.add_argument("--gate-spacing", type=float, default=GATE_SPACING, help="Abstand der Fitnesslinien in Pixeln")
+        sub_parser.add_argument("--close", action="store_true", help="offene Wände schließen")
+    args = parser.parse_args()
+
+    if args.command == "draw":
+        main(args.output)
+    elif args.command == "build":
+        try:
+            track, before, after = build_file(args.output, args.outer, args.inner, args.start, args.fitness,
+                                              tolerance=args.tolerance, gate_spacing=args.gate_spacing, close=args.close)
+        except ValueError as error:
+            sys.exit("Fehler: {}".format(error))
+        print("{} -> {} Wandstücke, {} Fitnesslinien, {}".format(before, after, len(track.gates), args.output))
+    else:
+        sys.exit(1 if any(error for _, error in build_batch(args.manifest, args.output_dir, tolerance=args.tolerance,
+                                                                gate_spacing=args.gate_spacing, close=args.close)) else 0)
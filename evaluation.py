@@ -0,0 +1,257 @@
+"""Bewertet Genome, wahlweise verteilt auf mehrere Prozesse und mit Cache für schon bekannte Genome"""
+from collections import OrderedDict
+from multiprocessing import Pool
+import hashlib
+import os
+import pickle
+import neat
+import numpy as np
+import telemetry
+from network import NetworkBatch
+from simulation import SIMULATION_VERSION, SimulationSettings, run_generation
+from track import TrackRegistry
+
+CACHE_SIZE = 100000
+AGGREGATIONS = {"mean": np.mean, "min": np.min, "median": np.median, "sum": np.sum}
+
+_TRACKS = None #Rennstrecken eines Worker Prozesses nach Name, werden einmal beim Start übergeben
+_SETTINGS = None
+
+
+def evaluate_genomes(genomes, config, track, renderer=None, settings=None):
+    """Simuliert die Genome (genome_id, genome) auf der Strecke und setzt ihre Fitness"""
+    networks = NetworkBatch.create(genomes, config)
+    for (_, g), fitness in zip(genomes, run_generation(networks, track, renderer, settings)):
+        g.fitness = fitness
+
+
+def as_registry(tracks):
+    """Eine einzelne Strecke wird zu einer TrackRegistry mit nur dieser Strecke unter dem Namen None"""
+    return tracks if isinstance(tracks, TrackRegistry) else TrackRegistry({None: tracks})
+
+
+def init_worker(tracks, settings, measure=False):
+    """Merkt sich die gemeinsamen Rennstrecken und Einstellungen im Worker, measure schaltet die Zeitmessung ein"""
+    global _TRACKS, _SETTINGS
+    _TRACKS = tracks
+    _SETTINGS = settings
+    if measure:
+        telemetry.enable()
+
+
+def evaluate_chunk(genomes, config, track_name=None):
+    """Läuft im Worker, simuliert einen Teil der Population ohne Fenster auf der Strecke track_name
+    und gibt die Fitness Werte mit den gemessenen Zeiten zurück (None ohne Messung)"""
+    telemetry.TIMERS.reset()
+    evaluate_genomes(genomes, config, _TRACKS[track_name], settings=_SETTINGS)
+    return [g.fitness for _, g in genomes], telemetry.TIMERS.snapshot()
+
+
+class ParallelEvaluator:
+    """Verteilt die Genome einer Generation auf einen Prozess Pool, wie neat.ParallelEvaluator.
+    Jeder Worker simuliert seinen Teil als eigene Population, p.run(evaluator.evaluate, n) startet das Training.
+    tracks ist eine Track oder eine TrackRegistry, evaluate_tracks simuliert auf mehreren Strecken gleichzeitig.
+    Ist die Zeitmessung beim Erzeugen eingeschaltet, messen auch die Worker und ihre Zeiten werden aufsummiert.
+    close() oder with beendet den Pool."""
+    def __init__(self, num_workers, tracks, settings=None):
+        self.num_workers = num_workers
+        self.tracks = as_registry(tracks)
+        self.pool = Pool(num_workers, initializer=init_worker,
+                         initargs=(self.tracks.tracks, settings, telemetry.TIMERS.enabled))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Beendet die Worker, danach kann nicht mehr bewertet werden"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def evaluate_tracks(self, genomes, config, names):
+        """Fitness aller Genome auf jeder Strecke in names als {Name: Liste}, alle Teile aller Strecken laufen gleichzeitig"""
+        if not genomes:
+            return {name: [] for name in names}
+        size = -(-len(genomes) // self.num_workers)
+        chunks = [genomes[i:i + size] for i in range(0, len(genomes), size)]
+        jobs = {name: [self.pool.apply_async(evaluate_chunk, (chunk, config, name)) for chunk in chunks] for name in names}
+        results = {}
+        for name, track_jobs in jobs.items():
+            results[name] = []
+            for job in track_jobs:
+                fitnesses, timings = job.get()
+                results[name] += fitnesses
+                if timings is not None:
+                    telemetry.TIMERS.merge(timings)
+        return results
+
+    def evaluate(self, genomes, config):
+        """Fitness Funktion für neat.Population.run, auf der ersten Strecke"""
+        name = self.tracks.names()[0]
+        for (_, g), fitness in zip(genomes, self.evaluate_tracks(genomes, config, [name])[name]):
+            g.fitness = fitness
+
+
+class Curriculum:
+    """Plan welche Strecken ab welcher Generation zählen, stages ist eine Liste von (erste Generation, [Namen])"""
+    def __init__(self, stages):
+        self.stages = sorted(stages, key=lambda stage: stage[0])
+
+    @classmethod
+    def parse(cls, text):
+        """Liest einen Plan wie "0:oval;50:oval,rennstrecke", Stufen durch ; getrennt"""
+        stages = []
+        for stage in text.split(";"):
+            start, names = stage.split(":")
+            stages.append((int(start), [name.strip() for name in names.split(",")]))
+        return cls(stages)
+
+    def tracks(self, generation):
+        """Namen der Strecken für diese Generation"""
+        names = self.stages[0][1]
+        for start, stage_names in self.stages:
+            if start <= generation:
+                names = stage_names
+        return names
+
+
+class MultiTrackEvaluator(neat.reporting.BaseReporter):
+    """Bewertet jedes Genom auf allen Strecken der registry oder auf denen, die das curriculum für die Generation vorsieht.
+    Die Fitness ist die mit aggregate (mean, min, median, sum) zusammengefasste Fitness der einzelnen Strecken.
+    Mit parallel (ein ParallelEvaluator über dieselbe registry) laufen die Strecken gleichzeitig in dessen Pool.
+    Muss als Reporter angemeldet werden, damit es die Generation für das curriculum kennt."""
+    def __init__(self, registry, curriculum=None, aggregate="mean", settings=None, parallel=None, renderer=None):
+        self.registry = registry
+        self.curriculum = curriculum
+        self.aggregate = aggregate
+        self.settings = settings
+        self.parallel = parallel
+        self.renderer = renderer
+        self.generation = 0
+        self.track_fitness = {} #Fitness pro Strecke der zuletzt bewerteten Genome, {Name: Liste}
+
+        for name in self.curriculum_names():
+            if name not in registry.tracks:
+                raise ValueError("Strecke {} ist nicht in der Registry".format(name))
+
+    def curriculum_names(self):
+        """Alle Strecken die im curriculum vorkommen"""
+        if self.curriculum is None:
+            return self.registry.names()
+        return [name for _, names in self.curriculum.stages for name in names]
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def active_tracks(self):
+        """Namen der Strecken für die aktuelle Generation"""
+        if self.curriculum is None:
+            return self.registry.names()
+        return self.curriculum.tracks(self.generation)
+
+    @property
+    def identity(self):
+        """Hash über die aktiven Strecken und die Zusammenfassung, für den Fitness Cache"""
+        return self.registry.identity(self.active_tracks()) + self.aggregate
+
+    def evaluate(self, genomes, config):
+        """Fitness Funktion für neat.Population.run"""
+        names = self.active_tracks()
+        if self.parallel is not None:
+            results = self.parallel.evaluate_tracks(genomes, config, names)
+        else:
+            networks = NetworkBatch.create(genomes, config)
+            results = {name: run_generation(networks, self.registry[name], self.renderer, self.settings) for name in names}
+        self.track_fitness = results
+        fitness = AGGREGATIONS[self.aggregate](np.array([results[name] for name in names], dtype=float), axis=0)
+        for (_, g), value in zip(genomes, fitness.tolist()):
+            g.fitness = value
+
+
+def genome_key(genome, config, track, settings=None):
+    """Hash über das ausgeprägte Netz (Knoten, Verbindungen, Gewichte), die Strecke, die Einstellungen und SIMULATION_VERSION.
+    track kann alles mit einer identity sein, z.B. ein MultiTrackEvaluator für dessen aktive Strecken.
+    Deaktivierte Verbindungen und Knoten ohne Einfluss auf die Ausgänge ändern den Schlüssel nicht."""
+    net = neat.nn.FeedForwardNetwork.create(genome, config)
+    nodes = tuple((node, act_func.__name__, agg_func.__name__, bias, response, tuple(links))
+                  for node, act_func, agg_func, bias, response, links in net.node_evals)
+    settings = settings or SimulationSettings()
+    data = (SIMULATION_VERSION, nodes, tuple(net.input_nodes), tuple(net.output_nodes), track.identity,
+            sorted(vars(settings).items()))
+    return hashlib.sha1(repr(data).encode()).hexdigest()
+
+
+class FitnessCache:
+    """LRU Cache für Fitness Werte mit höchstens max_size Einträgen, mit path wird er auf der Platte gehalten"""
+    def __init__(self, max_size=CACHE_SIZE, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                self.entries = pickle.load(f)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Fitness zum Schlüssel oder None"""
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return fitness
+
+    def put(self, key, fitness):
+        """Speichert eine Fitness, der am längsten unbenutzte Eintrag fliegt raus wenn der Cache voll ist"""
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        """Schreibt den Cache atomar nach path"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+
+class CachedEvaluator:
+    """Wird vor eine Fitness Funktion geschaltet, simuliert nur Genome die noch nicht im Cache sind"""
+    def __init__(self, fitness_function, cache, track, settings=None):
+        self.fitness_function = fitness_function
+        self.cache = cache
+        self.track = track
+        self.settings = settings
+
+    def evaluate(self, genomes, config):
+        """Fitness Funktion für neat.Population.run"""
+        misses = []
+        for genome_id, g in genomes:
+            key = genome_key(g, config, self.track, self.settings)
+            fitness = self.cache.get(key)
+            if fitness is None:
+                misses.append((key, (genome_id, g)))
+            else:
+                g.fitness = fitness
+
+        if misses:
+            self.fitness_function([genome for _, genome in misses], config)
+            for key, (_, g) in misses:
+                self.cache.put(key, g.fitness)
+            if self.cache.path is not None:
+                self.cache.save()
@@ -0,0 +1,141 @@
+"""Geometrie Hilfsfunktionen für Wände, Fitnesslinien und Sensoren"""
+import numpy as np
+
+
+def segment_intersect(p1, p2, p3, p4):
+    """Schneidet die Strecke p1-p2 mit p3-p4 ohne Objekte anzulegen, Punkte sind Tupel oder Vektoren.
+    Gibt (hit, t) zurück, t ist die Stelle des ersten Berührpunkts auf p1-p2 (0 bis 1).
+    Wie bei shapely zählen Berühren an Endpunkten und kollineares Überlappen als Schnitt, Strecken der Länge 0 nie."""
+    rx = p2[0] - p1[0]
+    ry = p2[1] - p1[1]
+    sx = p4[0] - p3[0]
+    sy = p4[1] - p3[1]
+    qx = p3[0] - p1[0]
+    qy = p3[1] - p1[1]
+    denom = rx * sy - ry * sx
+    t_num = qx * sy - qy * sx
+    u_num = qx * ry - qy * rx
+
+    if denom != 0:
+        if denom < 0:
+            denom, t_num, u_num = -denom, -t_num, -u_num
+        if 0 <= t_num <= denom and 0 <= u_num <= denom:
+            return True, t_num / denom
+        return False, 0.0
+
+    rr = rx * rx + ry * ry
+    if u_num != 0 or rr == 0:
+        return False, 0.0
+    t0 = (qx * rx + qy * ry) / rr
+    t1 = t0 + (sx * rx + sy * ry) / rr
+    low, high = min(t0, t1), max(t0, t1)
+    if low <= 1 and high >= 0:
+        return True, min(max(low, 0.0), 1.0)
+    return False, 0.0
+
+
+def line_intersect(p1, p2, p3, p4):
+    """Gibt True zurück falls sich die Strecken p1-p2 und p3-p4 berühren"""
+    return segment_intersect(p1, p2, p3, p4)[0]
+
+
+def segment_intersect_many(p1, p2, starts, ends):
+    """Schneidet eine Strecke p1-p2 mit vielen Strecken starts-ends (S, 2) in einem Durchgang, gibt (hit, t) als Arrays (S,) zurück"""
+    return segment_intersections(np.asarray(p1, dtype=float), np.asarray(p2, dtype=float), np.asarray(starts, dtype=float), np.asarray(ends, dtype=float))
+
+
+def polyline_segments(points):
+    """Macht aus einer Punkteliste ein Array (S, 2, 2) mit Anfang und Ende jedes Wandstücks"""
+    points = np.asarray(points, dtype=float)
+    return np.stack((points[:-1], points[1:]), axis=1)
+
+
+def cross(a, b):
+    """2D Kreuzprodukt über die letzte Achse"""
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def segment_intersections(p1, p2, p3, p4):
+    """Schneidet Strecken p1-p2 mit Strecken p3-p4, alle Argumente broadcastbar mit x/y in der letzten Achse.
+    Gibt (hit, t) zurück, t ist die Stelle des ersten Berührpunkts auf p1-p2 (0 bis 1).
+    Berühren an Endpunkten und kollineares Überlappen zählen wie bei shapely als Schnitt, Strecken der Länge 0 nie."""
+    r = p2 - p1
+    s = p4 - p3
+    qp = p3 - p1
+    denom = cross(r, s)
+    t_num = cross(qp, s)
+    u_num = cross(qp, r)
+
+    #Vorzeichen in den Zähler ziehen, dann reichen Vergleiche ohne Division
+    sign = np.where(denom < 0, -1.0, 1.0)
+    denom = denom * sign
+    t_num = t_num * sign
+    u_num = u_num * sign
+    hit = (denom != 0) & (t_num >= 0) & (t_num <= denom) & (u_num >= 0) & (u_num <= denom)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = t_num / denom
+
+    collinear = (denom == 0) & (u_num == 0)
+    if collinear.any():
+        #Überlappung der beiden Strecken als Intervall auf p1-p2
+        rr = (r * r).sum(axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t0 = (qp * r).sum(axis=-1) / rr
+            t1 = t0 + (s * r).sum(axis=-1) / rr
+        low = np.minimum(t0, t1)
+        high = np.maximum(t0, t1)
+        overlap = collinear & (rr != 0) & (low <= 1) & (high >= 0)
+        hit = hit | overlap
+        t = np.where(overlap, np.clip(low, 0, 1), t)
+    return hit, t
+
+
+def closest_points(points, a, b):
+    """Nächste Punkte auf den Strecken a-b (..., 2) zu Punkten (..., 2), broadcastbar"""
+    ab = b - a
+    ap = points - a
+    length = (ab * ab).sum(axis=-1)
+    t = np.clip((ap * ab).sum(axis=-1) / np.where(length > 0, length, 1), 0, 1)
+    return a + t[..., None] * ab
+
+
+def point_segment_distance(points, a, b):
+    """Abstand von Punkten (..., 2) zu Strecken a-b (..., 2), broadcastbar"""
+    return np.hypot(*np.moveaxis(points - closest_points(points, a, b), -1, 0))
+
+
+def point_in_polygon(points, polygon):
+    """Gibt für Punkte (..., 2) zurück ob sie im geschlossenen Linienzug polygon (P, 2) liegen (gerade/ungerade Regel)"""
+    points = np.asarray(points, dtype=float)[..., None, :]
+    a, b = np.asarray(polygon[:-1], dtype=float), np.asarray(polygon[1:], dtype=float)
+    crosses = (a[:, 1] > points[..., 1]) != (b[:, 1] > points[..., 1])
+    dy = np.where(crosses, b[:, 1] - a[:, 1], 1)
+    x = a[:, 0] + (points[..., 1] - a[:, 1]) * (b[:, 0] - a[:, 0]) / dy
+    return (crosses & (points[..., 0] < x)).sum(axis=-1) % 2 == 1
+
+
+def simplify_polyline(points, tolerance):
+    """Douglas-Peucker: behält nur die Punkte, ohne die der Linienzug um mehr als tolerance abweichen würde.
+    Ein geschlossener Linienzug (erster gleich letzter Punkt) wird am entferntesten Punkt geteilt und bleibt geschlossen."""
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points.copy()
+    if np.array_equal(points[0], points[-1]):
+        far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+        return np.concatenate((simplify_polyline(points[:far + 1], tolerance), simplify_polyline(points[far:], tolerance)[1:]))
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distance = point_segment_distance(points[first + 1:last], points[first], points[last])
+        k = int(np.argmax(distance))
+        if distance[k] > tolerance:
+            middle = first + 1 + k
+            keep[middle] = True
+            stack += [(first, middle), (middle, last)]
+    return points[keep]
+
@@ -0,0 +1,134 @@
+"""Zeichnet Fahrten als kompaktes Binärlog auf, damit sie später mit replay.py abgespielt werden können.
+
+Ein Log beginnt mit Kennung, Version, Anzahl Sensoren und deren Endpunkten relativ zum Auto, danach folgen Blöcke:
+R startet eine Fahrt (Streckenname, Außen- und Innenwand, Labels der Autos),
+F ist ein Frame (Schritt, Anzahl Autos, dann ein Eintrag nach frame_dtype pro lebendem Auto).
+"""
+import struct
+import numpy as np
+
+LOG_MAGIC = b"CARTRAJ\0"
+LOG_VERSION = 2
+HEADER = struct.Struct("<8sII")     #Kennung, Version, Anzahl Sensoren
+RUN = struct.Struct("<cIIII")       #Tag, Länge Name, Punkte Außenwand, Punkte Innenwand, Anzahl Labels
+FRAME = struct.Struct("<cII")       #Tag, Schritt, Anzahl Autos
+
+
+def frame_dtype(sensors):
+    """Ein Auto in einem Frame: Index in der Population, Mitte, Winkel im Bogenmaß und die Treffpunkte der Sensoren"""
+    return np.dtype([("car", "<i4"), ("x", "<f4"), ("y", "<f4"), ("radian", "<f4"), ("hits", "<f4", (sensors, 2))])
+
+
+class TrajectoryRecorder:
+    """Beobachter für run_generation wie ScreenRenderer, schreibt aber jeden Frame in die Datei path statt zu zeichnen.
+    labels sind die Namen der Autos im Log (z.B. die Genom ids), ohne Angabe ihr Index in der Population.
+    Jede neue Population startet eine neue Fahrt im selben Log, close() oder with schließt die Datei."""
+    def __init__(self, path, labels=None):
+        self.path = path
+        self.labels = labels
+        self.file = None
+        self.dtype = None
+        self.population = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def begin_frame(self):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def start_run(self, population):
+        """Schreibt den Kopf einer neuen Fahrt, beim ersten Mal auch den Kopf der Datei"""
+        sensors = population.distance_points.shape[1]
+        if self.file is None:
+            self.file = open(self.path, "wb")
+            self.file.write(HEADER.pack(LOG_MAGIC, LOG_VERSION, sensors))
+            self.file.write(np.ascontiguousarray(population.sensor_offsets, dtype="<f8").tobytes())
+            self.dtype = frame_dtype(sensors)
+        track = population.track
+        name = (track.path or "").encode()
+        labels = np.arange(population.size) if self.labels is None else np.asarray(self.labels)
+        self.file.write(RUN.pack(b"R", len(name), len(track.outer_wall), len(track.inner_wall), len(labels)))
+        self.file.write(name)
+        self.file.write(np.ascontiguousarray(track.outer_wall, dtype="<f8").tobytes())
+        self.file.write(np.ascontiguousarray(track.inner_wall, dtype="<f8").tobytes())
+        self.file.write(labels.astype("<i8").tobytes())
+        self.population = population
+
+    def draw_population(self, population):
+        """Schreibt Pose und Sensor Treffpunkte aller lebenden Autos"""
+        if population is not self.population:
+            self.start_run(population)
+        n = population.count
+        frame = np.empty(n, dtype=self.dtype)
+        frame["car"] = population.ids[:n]
+        frame["x"] = population.center_pos[:n, 0]
+        frame["y"] = population.center_pos[:n, 1]
+        frame["radian"] = population.radian[:n]
+        frame["hits"] = population.distance_points[:n]
+        self.file.write(FRAME.pack(b"F", population.steps, n))
+        self.file.write(frame.tobytes())
+
+
+class Run:
+    """Eine aufgezeichnete Fahrt: Strecke, Labels der Autos, Endpunkte der Sensoren und die Frames als (Schritt, Array nach frame_dtype)"""
+    def __init__(self, track_path, outer_wall, inner_wall, labels, sensor_offsets):
+        self.track_path = track_path
+        self.sensor_offsets = sensor_offsets
+        self.outer_wall = outer_wall
+        self.inner_wall = inner_wall
+        self.labels = labels
+        self.frames = []
+
+    def select(self, labels):
+        """Frames nur mit den Autos, deren Label in labels ist, Frames ohne eines dieser Autos fallen weg"""
+        cars = np.flatnonzero(np.isin(self.labels, labels))
+        frames = [(step, frame[np.isin(frame["car"], cars)]) for step, frame in self.frames]
+        return [(step, frame) for step, frame in frames if len(frame)]
+
+
+def load_log(path):
+    """Liest ein Log von TrajectoryRecorder, gibt die Liste der Fahrten zurück"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, sensors = HEADER.unpack_from(data, 0)
+    if magic != LOG_MAGIC:
+        raise ValueError("{} ist kein Fahrten Log".format(path))
+    if version != LOG_VERSION:
+        raise ValueError("{} hat Version {}, erwartet wird {}".format(path, version, LOG_VERSION))
+    dtype = frame_dtype(sensors)
+    sensor_offsets = np.frombuffer(data, "<f8", sensors * 2, HEADER.size).reshape(-1, 2)
+
+    runs = []
+    offset = HEADER.size + sensors * 16
+    while offset < len(data):
+        tag = data[offset:offset + 1]
+        if tag == b"R":
+            _, name_length, outer, inner, labels = RUN.unpack_from(data, offset)
+            offset += RUN.size
+            name = data[offset:offset + name_length].decode() or None
+            offset += name_length
+            outer_wall = np.frombuffer(data, "<f8", outer * 2, offset).reshape(-1, 2)
+            offset += outer * 16
+            inner_wall = np.frombuffer(data, "<f8", inner * 2, offset).reshape(-1, 2)
+            offset += inner * 16
+            runs.append(Run(name, outer_wall, inner_wall, np.frombuffer(data, "<i8", labels, offset), sensor_offsets))
+            offset += labels * 8
+        elif tag == b"F":
+            _, step, count = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            runs[-1].frames.append((step, np.frombuffer(data, dtype, count, offset)))
+            offset += count * dtype.itemsize
+        else:
+            raise ValueError("{} ist ab Byte {} beschädigt".format(path, offset))
+    return runs
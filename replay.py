@@ -0,0 +1,128 @@
+"""Nimmt Fahrten headless auf und spielt die Logs später ab, in beliebiger Geschwindigkeit und wahlweise nur für einzelne Genome.
+
+python replay.py record fahrt.log --genome best_car_genom.txt
+python replay.py record fahrt.log --checkpoint neat-checkpoint-50 --generation 10 20 30
+python replay.py show fahrt.log --speed 4 --genomes 12 40
+
+Beim Abspielen: Leertaste pausiert, Pfeil hoch/runter ändert die Geschwindigkeit, Escape beendet.
+"""
+import argparse
+import pickle
+import neat
+import numpy as np
+import pygame
+from checkpoint import Checkpointer
+from network import NetworkBatch
+from recording import TrajectoryRecorder, load_log
+from sensors import load_config
+from simulation import CORNER_OFFSETS, SimulationSettings, rotate_offsets, run_generation
+from track import Track
+
+WIN_WIDTH = 1280
+WIN_HEIGHT = 1024
+FPS = 60
+
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+GREY = (100, 100, 100)
+
+
+def record(path, genomes, config, track, settings=None):
+    """Simuliert die Genome ohne Fenster und schreibt ihre Fahrten nach path, Label ist der Genom key.
+    Gibt die Fitness pro Genom zurück, die Simulation ist dieselbe wie im Training."""
+    networks = NetworkBatch([neat.nn.FeedForwardNetwork.create(g, config) for g in genomes])
+    with TrajectoryRecorder(path, [g.key for g in genomes]) as recorder:
+        return run_generation(networks, track, recorder, settings)
+
+
+def draw_frame(screen, run, frame):
+    """Zeichnet Strecke und alle Autos eines Frames wie ScreenRenderer"""
+    screen.fill(GREY)
+    pygame.draw.lines(screen, WHITE, False, run.outer_wall)
+    pygame.draw.lines(screen, WHITE, False, run.inner_wall)
+    centers = np.stack((frame["x"], frame["y"]), axis=1).astype(float)
+    radians = frame["radian"].astype(float)
+    corners = centers[:, None, :] + rotate_offsets(CORNER_OFFSETS, radians)
+    detection_points = centers[:, None, :] + rotate_offsets(run.sensor_offsets, radians)
+    for center, car_corners, car_detection, hits in zip(centers, corners, detection_points, frame["hits"]):
+        pygame.draw.lines(screen, GREEN, True, car_corners.tolist())
+        for point in car_detection:
+            pygame.draw.line(screen, GREEN, point, center)
+        for hit in hits:
+            pygame.draw.circle(screen, GREEN, (int(hit[0]), int(hit[1])), 5)
+
+
+def play(run, labels=None, speed=1.0, fps=FPS):
+    """Spielt eine Fahrt ab, speed ist die Anzahl Simulationsschritte pro angezeigtem Frame"""
+    frames = run.frames if labels is None else run.select(labels)
+    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+    clock = pygame.time.Clock()
+    position = 0.0
+    paused = False
+    while position < len(frames):
+        clock.tick(fps)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_UP:
+                    speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    speed /= 2
+        step, frame = frames[int(position)]
+        draw_frame(screen, run, frame)
+        pygame.display.set_caption("Schritt {}  Autos {}  Tempo {:g}x".format(step, len(frame), speed))
+        pygame.display.update()
+        if not paused:
+            position += speed
+
+
+def checkpoint_genomes(path, generations=None):
+    """Die besten Genome der Generationen aus dem StatisticsReporter eines Checkpoints, ohne generations alle"""
+    population, stats = Checkpointer.restore(path)
+    if stats is None:
+        raise ValueError("{} enthält keine Statistik".format(path))
+    best = stats.most_fit_genomes
+    generations = range(len(best)) if generations is None else generations
+    return [best[generation] for generation in generations], population.config
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Genome headless fahren lassen und aufzeichnen")
+    record_parser.add_argument("log")
+    record_parser.add_argument("--genome", nargs="+", default=[], help="gepickelte Genome, z.B. best_car_genom.txt")
+    record_parser.add_argument("--checkpoint", help="die besten Genome aus diesem Checkpoint aufzeichnen")
+    record_parser.add_argument("--generation", type=int, nargs="+", help="nur die besten dieser Generationen")
+    record_parser.add_argument("--track", default="Rennstrecke.track")
+    record_parser.add_argument("--config", default="config-feedforward.txt")
+    record_parser.add_argument("--fitness-limit", type=int, default=4000)
+    record_parser.add_argument("--max-steps", type=int)
+
+    show_parser = commands.add_parser("show", help="ein Log abspielen")
+    show_parser.add_argument("log")
+    show_parser.add_argument("--run", type=int, default=0, help="welche Fahrt im Log")
+    show_parser.add_argument("--genomes", type=int, nargs="+", help="nur diese Genome zeigen")
+    show_parser.add_argument("--speed", type=float, default=1.0, help="Schritte pro angezeigtem Frame")
+    show_parser.add_argument("--fps", type=int, default=FPS)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        genomes = []
+        config = None
+        if args.checkpoint:
+            genomes, config = checkpoint_genomes(args.checkpoint, args.generation)
+        for genome_file in args.genome:
+            with open(genome_file, "rb") as f:
+                genomes.append(pickle.load(f))
+        if config is None:
+            config = load_config(args.config)
+        settings = SimulationSettings(fitness_limit=args.fitness_limit, max_steps=args.max_steps, sensors=getattr(config, "sensors", None))
+        for genome, fitness in zip(genomes, record(args.log, genomes, config, Track.load(args.track), settings)):
+            print("Genom {:<8} Fitness {}".format(genome.key, fitness))
+    else:
+        play(load_log(args.log)[args.run], args.genomes, args.speed, args.fps)
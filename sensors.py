@@ -0,0 +1,79 @@
+"""Sensoren: alle Strahlen aller Autos werden in einem Schritt mit den Wandstücken geschnitten"""
+from configparser import ConfigParser
+import neat
+import numpy as np
+from geometry import segment_intersections
+
+#Die ursprünglichen drei Sensoren zu den Ecken oben links, oben rechts und zur Mitte oben des 8 fach vergrößerten Autos
+DEFAULT_OFFSETS = ((-80.0, -160.0), (80.0, -160.0), (0.0, -160.0))
+
+
+class SensorRig:
+    """Anordnung der Strahlen relativ zum Auto: Winkel in Grad (0 ist geradeaus, positiv nach rechts) und Reichweite.
+    Die Einheitsrichtungen und Endpunkte (offsets) werden einmal berechnet, pro Schritt wird nur noch gedreht."""
+    def __init__(self, angles, ranges, offsets=None):
+        self.angles = np.asarray(angles, dtype=float).reshape(-1)
+        self.ranges = np.broadcast_to(np.asarray(ranges, dtype=float), self.angles.shape).copy()
+        radians = np.radians(self.angles)
+        self.directions = np.stack((np.sin(radians), -np.cos(radians)), axis=1)
+        self.offsets = self.directions * self.ranges[:, None] if offsets is None else np.asarray(offsets, dtype=float)
+
+    @classmethod
+    def from_offsets(cls, offsets):
+        """Strahlen zu festen Endpunkten relativ zur Mitte, die Endpunkte bleiben exakt erhalten"""
+        offsets = np.asarray(offsets, dtype=float)
+        angles = np.degrees(np.arctan2(offsets[:, 0], -offsets[:, 1]))
+        return cls(angles, np.hypot(offsets[:, 0], offsets[:, 1]), offsets)
+
+    @classmethod
+    def from_config(cls, section):
+        """Liest eine [Sensors] Sektion: angles ist eine Liste von Winkeln, ranges eine Reichweite pro Winkel oder eine für alle"""
+        angles = [float(angle) for angle in section["angles"].split()]
+        ranges = [float(value) for value in section["ranges"].split()]
+        if len(ranges) not in (1, len(angles)):
+            raise ValueError("[Sensors] braucht eine Reichweite oder eine pro Winkel, nicht {}".format(len(ranges)))
+        return cls(angles, ranges)
+
+    @property
+    def num_inputs(self):
+        return len(self.angles)
+
+    def __repr__(self):
+        #Geht in den Schlüssel des Fitness Caches ein
+        return "SensorRig(offsets={!r})".format(self.offsets.tolist())
+
+
+DEFAULT_SENSORS = SensorRig.from_offsets(DEFAULT_OFFSETS)
+
+
+def load_config(config_file):
+    """Lädt die NEAT Config und die Sensoren aus ihrer [Sensors] Sektion (ohne Sektion die drei ursprünglichen).
+    num_inputs der Genome wird an die Anzahl der Strahlen angepasst, die Sensoren hängen als config.sensors an der Config."""
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                                neat.DefaultStagnation, config_file)
+    parameters = ConfigParser()
+    parameters.read(config_file)
+    sensors = SensorRig.from_config(parameters["Sensors"]) if parameters.has_section("Sensors") else DEFAULT_SENSORS
+    config.sensors = sensors
+    config.genome_config.num_inputs = sensors.num_inputs
+    config.genome_config.input_keys = [-i - 1 for i in range(sensors.num_inputs)]
+    return config
+
+
+def cast_rays(origins, ends, grid):
+    """origins (N, 2) Mitte der Autos, ends (N, K, 2) Endpunkte der K Strahlen, grid das SegmentGrid der Wände.
+    Gibt den nächsten Treffpunkt (N, K, 2), dessen Abstand (N, K) und ob getroffen wurde (N, K) zurück.
+    Ohne Treffer ist der Treffpunkt das Ende des Strahls."""
+    ends = np.asarray(ends, dtype=float)
+    n, k = ends.shape[:2]
+    starts = np.repeat(np.asarray(origins, dtype=float), k, axis=0)
+    ends = ends.reshape(n * k, 2)
+    segments = grid.candidate_segments(starts, ends)
+    hit, t = segment_intersections(starts[:, None, :], ends[:, None, :], segments[:, :, 0], segments[:, :, 1])
+
+    t = np.where(hit, t, 1.0).min(axis=-1, initial=1.0)
+    found = hit.any(axis=-1)
+    ray = ends - starts
+    points = starts + t[:, None] * ray
+    distances = t * np.hypot(ray[:, 0], ray[:, 1])
+    return points.reshape(n, k, 2), distances.reshape(n, k), found.reshape(n, k)
@@ -0,0 +1,294 @@
+"""Simuliert die ganze Population auf einmal, mit NumPy Arrays statt einzelnen Car Objekten"""
+import numpy as np
+from geometry import point_segment_distance, segment_intersections
+from sensors import DEFAULT_SENSORS, cast_rays
+import telemetry
+
+HALF_WIDTH = 10
+HALF_HEIGHT = 20
+ACCELERATION = 0.5
+DRAG = 0.85
+ANGULAR_DRAG = 0.85
+TURN_SPEED = 0.4
+FITNESS_LIMIT = 6000 #Ab hier fährt ein Auto nicht weiter
+TIMEOUT = 100 #Frames ohne neue Fitness Linie bis ein Auto stirbt
+SIMULATION_VERSION = 2 #Bei jeder Änderung die eine Fitness ändern kann erhöhen, alte Einträge im Fitness Cache gelten dann nicht mehr
+
+#Ecken relativ zur Mitte: oben links, oben rechts, unten rechts, unten links
+CORNER_OFFSETS = np.array([(-HALF_WIDTH, -HALF_HEIGHT), (HALF_WIDTH, -HALF_HEIGHT),
+                           (HALF_WIDTH, HALF_HEIGHT), (-HALF_WIDTH, HALF_HEIGHT)], dtype=float)
+HULL_RADIUS = float(np.hypot(HALF_WIDTH, HALF_HEIGHT)) #Kein Punkt des Autos ist weiter von der Mitte weg
+#Der überstrichene Rumpf: alle vier Kanten an der neuen Position und die Wege der vier Ecken seit dem letzten Schritt.
+#Die Kanten an der alten Position braucht es nicht, die wurden schon im letzten Schritt geprüft.
+HULL_EDGES = ((0, 1), (1, 2), (2, 3), (3, 0))
+SWEPT_STARTS = [a for a, _ in HULL_EDGES] + [4, 5, 6, 7]
+SWEPT_ENDS = [b for _, b in HULL_EDGES] + [0, 1, 2, 3]
+
+
+def rotate_offsets(offsets, radian):
+    """Dreht Offsets (K, 2) für jedes Auto um seinen Winkel, gibt (N, K, 2) zurück"""
+    cos = np.cos(radian)[:, None]
+    sin = np.sin(radian)[:, None]
+    x = offsets[None, :, 0]
+    y = offsets[None, :, 1]
+    return np.stack((x * cos - y * sin, x * sin + y * cos), axis=-1)
+
+
+class SimulationSettings:
+    """Einstellungen der Simulation. Gleiche Einstellungen, Strecke und Genom ergeben immer dieselbe Fitness.
+
+    dt ist der feste Zeitschritt in Frames, 1 entspricht der ursprünglichen Physik pro Frame.
+    max_steps begrenzt die Schritte pro Generation, danach behält jedes Auto seine Fitness.
+    early_termination beendet Autos, die ihr nächstes Tor sicher nicht mehr rechtzeitig erreichen.
+    Das ändert keine Fitness, sie hätten ohnehin keine Punkte mehr bekommen. Es ist aus, weil die meisten Autos an der Wand
+    sterben und nicht am Timeout: die Prüfung jedes Schritts kostet auf Rennstrecke.track mehr als die gesparten Schritte.
+    sensors ist das SensorRig, ohne Angabe die drei ursprünglichen Strahlen.
+    """
+    def __init__(self, dt=1.0, fitness_limit=FITNESS_LIMIT, timeout=TIMEOUT,
+                 max_steps=None, early_termination=False, sensors=None):
+        self.dt = dt
+        self.fitness_limit = fitness_limit
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.early_termination = early_termination
+        self.sensors = DEFAULT_SENSORS if sensors is None else sensors
+
+
+class CarPopulation:
+    """Zustand aller Autos als structure of arrays, eine Zeile pro Auto.
+
+    Die lebenden Autos liegen immer kompakt in den Zeilen 0 bis count-1, jeder Schritt arbeitet nur auf
+    diesen Slices. Stirbt ein Auto, rückt ein lebendes vom Ende in seine Zeile (swap remove), ids sagt
+    welches Auto in welcher Zeile steht und results hält die Fitness der fertigen Autos nach ihrer id.
+    """
+    STATE = ("center_pos", "velocity", "angle", "radian", "angular_velocity", "corner_rotated",
+             "previous_corners", "detection_point_rotated", "distance_points", "distances", "next_gate",
+             "fitness", "time_since_last_fitness", "ids")
+
+    def __init__(self, size, track, settings=None):
+        self.size = size
+        self.count = size
+        self.track = track
+        self.settings = settings or SimulationSettings()
+        self.gates = track.gates
+
+        self.center_pos = np.tile(np.asarray(track.start_point, dtype=float), (size, 1))
+        self.velocity = np.zeros((size, 2))
+        self.angle = np.zeros(size)
+        self.radian = np.zeros(size)
+        self.angular_velocity = np.zeros(size)
+
+        self.corner_rotated = self.center_pos[:, None, :] + CORNER_OFFSETS
+        self.previous_corners = self.corner_rotated.copy()
+        self.sensor_offsets = self.settings.sensors.offsets
+        self.detection_point_rotated = self.center_pos[:, None, :] + self.sensor_offsets
+        self.distance_points = self.detection_point_rotated.copy()
+        self.distances = np.zeros((size, len(self.sensor_offsets)))
+
+        self.next_gate = np.zeros(size, dtype=int)
+        self.fitness = np.zeros(size, dtype=int)
+        self.time_since_last_fitness = np.zeros(size, dtype=int)
+        self.ids = np.arange(size)
+        self.results = np.zeros(size, dtype=int)
+        self.steps = 0
+
+        dt = self.settings.dt
+        #Schneller als diese Geschwindigkeit pro Schritt wird ein Auto durch Gas geben nie
+        self.terminal_speed = ACCELERATION * dt / (1 - DRAG ** dt)
+        #Letzter Wert von time_since_last_fitness, bei dem ein Tor noch zählt: der größte k mit k * dt <= timeout,
+        #mit demselben Vergleich wie der Timeout in update(). timeout // dt kann wegen Rundung einen Schritt zu klein sein.
+        last_gate_step = int(self.settings.timeout // dt)
+        while (last_gate_step + 1) * dt <= self.settings.timeout:
+            last_gate_step += 1
+        while last_gate_step > 0 and last_gate_step * dt > self.settings.timeout:
+            last_gate_step -= 1
+        self.last_gate_step = last_gate_step
+
+    def remove(self, rows):
+        """Nimmt die Autos in den Zeilen rows aus der Simulation, O(1) pro Auto.
+        Die Lücken unterhalb des neuen Endes werden mit den lebenden Zeilen vom Ende gefüllt."""
+        rows = np.unique(rows)
+        if len(rows) == 0:
+            return
+        self.results[self.ids[rows]] = self.fitness[rows]
+        count = self.count - len(rows)
+        holes = rows[rows < count]
+        tail = np.ones(self.count - count, dtype=bool)
+        tail[rows[rows >= count] - count] = False
+        fillers = np.flatnonzero(tail) + count
+        for name in self.STATE:
+            array = getattr(self, name)
+            array[holes] = array[fillers]
+        self.count = count
+
+    def swept_segments(self):
+        """Kanten und Eckenwege des überstrichenen Rumpfs aller lebenden Autos als (count, 8, 2) Anfangs- und Endpunkte.
+        Trifft eine Strecke die Fläche die der Rumpf seit dem letzten Schritt überstrichen hat, kreuzt sie eine davon.
+        Bei Drehung sind die Eckenwege Sehnen statt Bögen, bei den kleinen Winkeln pro Schritt ist der Fehler winzig."""
+        n = self.count
+        corners = np.concatenate((self.corner_rotated[:n], self.previous_corners[:n]), axis=1)
+        return corners[:, SWEPT_STARTS], corners[:, SWEPT_ENDS]
+
+    def collision_with_wall(self):
+        """Gibt für jedes lebende Auto zurück ob sein Rumpf seit dem letzten Schritt die Wand berührt hat.
+        Liegt der ganze überstrichene Rumpf höchstens cell_size/2 um die Mitte, reicht die Zelle der Mitte als Kandidaten,
+        Autos in Zellen ohne Wand sind damit ohne einen einzigen Schnitt-Test fertig. Nur schnellere Autos tasten ihre Strecken ab."""
+        n = self.count
+        starts, ends = self.swept_segments()
+        grid = self.track.grid
+        center = self.center_pos[:n]
+        reach = np.hypot(*(center - self.previous_corners[:n].mean(axis=1)).T) + HULL_RADIUS
+        local = reach <= grid.cell_size / 2
+        hit = np.zeros(n, dtype=bool)
+
+        rows = np.flatnonzero(local)
+        candidates = grid.nearby(center[rows])
+        near = (candidates >= 0).any(axis=1)
+        rows = rows[near]
+        segments = grid.padded_segments[candidates[near]][:, None]
+        edge_hit, _ = segment_intersections(starts[rows][:, :, None], ends[rows][:, :, None], segments[..., 0, :], segments[..., 1, :])
+        hit[rows] = edge_hit.any(axis=(1, 2))
+
+        rows = np.flatnonzero(~local)
+        if len(rows):
+            edge_hit = grid.any_intersection(starts[rows].reshape(-1, 2), ends[rows].reshape(-1, 2))
+            hit[rows] = edge_hit.reshape(len(rows), -1).any(axis=1)
+        return hit
+
+    def collision_with_fitness_line(self):
+        """Gibt für jedes lebende Auto zurück ob sein Rumpf seit dem letzten Schritt sein nächstes Tor berührt hat"""
+        gates = self.gates[self.next_gate[:self.count]][:, None]
+        starts, ends = self.swept_segments()
+        hit, _ = segment_intersections(starts, ends, gates[..., 0, :], gates[..., 1, :])
+        return hit.any(axis=1)
+
+    def reachable_steps(self, rows):
+        """Wie viele Schritte die Autos noch haben um ein Tor zu erreichen, begrenzt durch Timeout und max_steps"""
+        steps = self.last_gate_step - self.time_since_last_fitness[rows]
+        if self.settings.max_steps is not None:
+            steps = np.minimum(steps, self.settings.max_steps - self.steps)
+        return steps
+
+    def cannot_reach_gate(self, rows):
+        """True für Autos, deren Rumpf ihr nächstes Tor in den verbleibenden Schritten sicher nicht mehr berührt.
+        Ihre Geschwindigkeit kann nie über max(jetzt, terminal_speed) steigen, der Rumpf liegt in HULL_RADIUS um die Mitte."""
+        gates = self.gates[self.next_gate[rows]]
+        distance = point_segment_distance(self.center_pos[rows], gates[:, 0], gates[:, 1]) - HULL_RADIUS
+        speed = np.maximum(np.hypot(*self.velocity[rows].T), self.terminal_speed)
+        return distance > self.reachable_steps(rows) * self.settings.dt * speed + 1e-9
+
+    def update(self):
+        """Wand und Tore prüfen, nimmt gestorbene und fertige Autos heraus und gibt die ids der gestorbenen zurück"""
+        n = self.count
+        timed_out = self.time_since_last_fitness[:n] * self.settings.dt > self.settings.timeout
+        dead = self.collision_with_wall() | timed_out
+
+        passed = np.flatnonzero(~dead & self.collision_with_fitness_line())
+        self.fitness[passed] += 10
+        self.time_since_last_fitness[passed] = 0
+        self.next_gate[passed] = (self.next_gate[passed] + 1) % len(self.gates)
+
+        finished = self.fitness[:n] >= self.settings.fitness_limit
+        if self.settings.max_steps is not None and self.steps >= self.settings.max_steps:
+            finished[:] = True
+        if self.settings.early_termination:
+            rows = np.flatnonzero(~dead)
+            hopeless = rows[self.cannot_reach_gate(rows)]
+            #Ohne Tor sterben sie am Timeout, außer max_steps beendet die Generation vorher ohne Strafe
+            if self.settings.max_steps is None:
+                dead[hopeless] = True
+            else:
+                timeout_steps = self.last_gate_step - self.time_since_last_fitness[hopeless]
+                doomed = timeout_steps < self.settings.max_steps - self.steps
+                dead[hopeless[doomed]] = True
+                finished[hopeless[~doomed]] = True
+
+        self.fitness[:n][dead] -= 5
+        died = self.ids[:n][dead]
+        self.remove(np.flatnonzero(dead | finished))
+        return died
+
+    def move(self):
+        """Bewegt alle lebenden Autos um einen Zeitschritt"""
+        n = self.count
+        dt = self.settings.dt
+        center = self.center_pos[:n]
+        center += self.velocity[:n] * dt
+        self.velocity[:n] *= DRAG ** dt
+        self.angle[:n] += self.angular_velocity[:n] * dt
+        self.angular_velocity[:n] *= ANGULAR_DRAG ** dt
+        radian = self.radian[:n]
+        np.multiply(self.angle[:n], np.pi / 180, out=radian)
+
+        self.time_since_last_fitness[:n] += 1
+        self.steps += 1
+        self.previous_corners[:n] = self.corner_rotated[:n]
+        self.corner_rotated[:n] = center[:, None, :] + rotate_offsets(CORNER_OFFSETS, radian)
+        self.detection_point_rotated[:n] = center[:, None, :] + rotate_offsets(self.sensor_offsets, radian)
+
+    def sense(self):
+        """Misst die Abstände der Sensoren aller lebenden Autos zur Wand"""
+        n = self.count
+        self.distance_points[:n], self.distances[:n], _ = cast_rays(self.center_pos[:n], self.detection_point_rotated[:n], self.track.grid)
+
+    def control(self, outputs):
+        """Setzt die Netzausgaben (count, 3) der lebenden Autos in Gas und Lenkung um"""
+        n = self.count
+        outputs = np.asarray(outputs)
+        radian = self.radian[:n]
+        accelerate = (outputs[:, 0] > 0.5) * (ACCELERATION * self.settings.dt)
+        steer = ((outputs[:, 1] > 0.2).astype(float) - (outputs[:, 2] > 0.2)) * (TURN_SPEED * self.settings.dt)
+        self.velocity[:n, 0] += np.sin(radian) * accelerate
+        self.velocity[:n, 1] -= np.cos(radian) * accelerate
+        self.angular_velocity[:n] += steer
+        self.angle[:n] += steer
+
+    def final_fitness(self):
+        """Fitness aller Autos nach ihrer id, auch der noch fahrenden"""
+        results = self.results.copy()
+        results[self.ids[:self.count]] = self.fitness[:self.count]
+        return results
+
+
+def run_generation(networks, track, renderer=None, settings=None):
+    """Fährt mit jedem Netz der NetworkBatch ein Auto bis es stirbt oder das Fitness Limit erreicht, gibt die Fitness pro Netz zurück.
+    Die Autos beeinflussen sich nicht, jede Fitness hängt also nur vom eigenen Netz ab.
+    Der renderer schaut nur zu, die Simulation läuft in festen Schritten unabhängig vom Zeichnen."""
+    population = CarPopulation(networks.size, track, settings)
+    #Zeile im NetworkBatch für jede Auto id, der Batch wird verkleinert sobald die Hälfte tot ist
+    network_rows = np.arange(networks.size)
+    timers = telemetry.TIMERS
+    timers.add_cars(networks.size)
+    timers.start()
+    while True:
+        if renderer is not None:
+            renderer.begin_frame()
+            timers.lap("rendering")
+
+        population.update()
+        timers.lap("collision")
+        population.move()
+        timers.lap("physics")
+        population.sense()
+        timers.lap("sensing")
+        timers.frame(population.count)
+        if renderer is not None:
+            renderer.draw_population(population)
+            timers.lap("rendering")
+
+        if population.count == 0:
+            break
+
+        ids = population.ids[:population.count]
+        if population.count <= networks.size // 2:
+            networks = networks.subset(network_rows[ids])
+            network_rows[ids] = np.arange(len(ids))
+        inputs = np.zeros((networks.size, networks.num_inputs))
+        inputs[network_rows[ids]] = population.distances[:population.count]
+        population.control(networks.activate(inputs)[network_rows[ids]])
+        timers.lap("activation")
+
+        if renderer is not None:
+            renderer.end_frame()
+            timers.lap("rendering")
+    return population.final_fitness().tolist()
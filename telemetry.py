@@ -0,0 +1,163 @@
+"""Zeitmessung der Simulation und ein NEAT Reporter, der pro Generation eine Zeile in eine CSV oder JSON-lines Datei schreibt"""
+import csv
+import json
+import os
+import time
+import neat
+
+SECTIONS = ("collision", "physics", "sensing", "activation", "rendering")
+FIELDS = ("generation", "population", "wall_s", "evaluation_s", "cars", "frames", "car_steps", "cars_per_second",
+          "car_steps_per_second") + tuple(section + "_s" for section in SECTIONS)
+
+
+class Timers:
+    """Summiert die Zeit der Abschnitte einer Generation. lap(section) bucht die Zeit seit dem letzten start oder lap"""
+    enabled = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Alle Summen auf 0"""
+        self.totals = dict.fromkeys(SECTIONS, 0.0)
+        self.cars = 0
+        self.frames = 0
+        self.car_steps = 0
+        self.last = time.perf_counter()
+
+    def start(self):
+        """Beginnt die Messung des nächsten Abschnitts"""
+        self.last = time.perf_counter()
+
+    def lap(self, section):
+        """Bucht die Zeit seit dem letzten start oder lap auf section"""
+        now = time.perf_counter()
+        self.totals[section] += now - self.last
+        self.last = now
+
+    def add_cars(self, cars):
+        """Zählt die Autos einer simulierten Population"""
+        self.cars += cars
+
+    def frame(self, cars):
+        """Zählt einen simulierten Schritt mit cars lebenden Autos"""
+        self.frames += 1
+        self.car_steps += cars
+
+    def snapshot(self):
+        """Die Summen als dict, zum Zurückgeben aus einem Worker Prozess"""
+        return dict(self.totals, cars=self.cars, frames=self.frames, car_steps=self.car_steps)
+
+    def merge(self, snapshot):
+        """Addiert die Summen eines Workers, die Zeiten sind dann Prozesszeiten und nicht mehr Wanduhrzeit"""
+        for section in SECTIONS:
+            self.totals[section] += snapshot[section]
+        self.cars += snapshot["cars"]
+        self.frames += snapshot["frames"]
+        self.car_steps += snapshot["car_steps"]
+
+
+class NullTimers:
+    """Ersatz für Timers wenn die Messung aus ist, jeder Aufruf tut nichts"""
+    enabled = False
+
+    def reset(self):
+        pass
+
+    def start(self):
+        pass
+
+    def lap(self, section):
+        pass
+
+    def add_cars(self, cars):
+        pass
+
+    def frame(self, cars):
+        pass
+
+    def snapshot(self):
+        return None
+
+    def merge(self, snapshot):
+        pass
+
+
+TIMERS = NullTimers() #Wird von enable() ersetzt, die Simulation holt sich die Timer pro Generation hier ab
+
+
+def enable():
+    """Schaltet die Messung in diesem Prozess ein und gibt die Timer zurück"""
+    global TIMERS
+    if not TIMERS.enabled:
+        TIMERS = Timers()
+    return TIMERS
+
+
+def disable():
+    """Schaltet die Messung wieder aus"""
+    global TIMERS
+    TIMERS = NullTimers()
+
+
+class TelemetryReporter(neat.reporting.BaseReporter):
+    """Schreibt pro Generation Wanduhrzeit, Frames, Autos pro Sekunde und die Zeit pro Abschnitt nach path.
+    Endet path auf .csv entsteht eine CSV Datei, sonst eine JSON Zeile pro Generation. Bestehende Dateien werden fortgesetzt."""
+    def __init__(self, path):
+        self.path = path
+        self.csv = path.endswith(".csv")
+        self.timers = enable()
+        self.generation = None
+        self.written = None
+        self.population = 0
+        self.start_time = 0.0
+        self.evaluation_time = 0.0
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.timers.reset()
+        self.start_time = time.perf_counter()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.population = len(population)
+        self.evaluation_time = time.perf_counter() - self.start_time
+
+    def end_generation(self, config, population, species_set):
+        self.write_row()
+
+    def found_solution(self, config, generation, best):
+        self.write_row()
+
+    def row(self):
+        """Die Werte der aktuellen Generation"""
+        wall = time.perf_counter() - self.start_time
+        timers = self.timers
+        evaluation = self.evaluation_time or wall
+        row = {"generation": self.generation,
+               "population": self.population,
+               "wall_s": wall,
+               "evaluation_s": self.evaluation_time,
+               "cars": timers.cars,
+               "frames": timers.frames,
+               "car_steps": timers.car_steps,
+               "cars_per_second": timers.cars / evaluation if evaluation else 0.0,
+               "car_steps_per_second": timers.car_steps / evaluation if evaluation else 0.0}
+        for section in SECTIONS:
+            row[section + "_s"] = timers.totals[section]
+        return row
+
+    def write_row(self):
+        """Hängt die Zeile der aktuellen Generation an die Datei an, höchstens einmal pro Generation"""
+        if self.generation is None or self.written == self.generation:
+            return
+        self.written = self.generation
+        row = self.row()
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            if self.csv:
+                writer = csv.DictWriter(f, FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row) + "\n")
@@ -0,0 +1,273 @@
+"""Rennstrecke laden und ein Gitter über die Wandstücke bauen, damit nur nahe Wände geprüft werden.
+
+Kompilierte Strecken (.track) sind eine Binärdatei: Kopf mit Kennung, Version und Tabelle,
+danach alle Arrays zusammenhängend und auf 64 Bytes ausgerichtet. Sie werden per memory map geladen,
+so teilen sich alle Worker Prozesse eine Kopie im Page Cache statt sie zu entpickeln.
+"""
+import argparse
+import glob
+import hashlib
+import math
+import os
+import pickle
+import struct
+import numpy as np
+from geometry import polyline_segments, segment_intersections
+
+GRID_CELL_SIZE = 64
+
+TRACK_MAGIC = b"CARTRACK"
+TRACK_VERSION = 1
+HEADER = struct.Struct("<8sII")             #Kennung, Version, Anzahl Arrays
+ENTRY = struct.Struct("<16s2sxxxxxxQQQ")    #Name, dtype, Offset, Zeilen, Spalten
+ALIGNMENT = 64
+DTYPES = {b"f8": np.dtype("<f8"), b"i8": np.dtype("<i8")}
+
+
+class SegmentGrid:
+    """Gleichmäßiges Gitter, jede Zelle kennt die Wandstücke in ihrer Nähe.
+
+    Jedes Wandstück steht in allen Zellen, die seine um cell_size/2 vergrößerte Bounding Box berührt.
+    Anfragen tasten ihre Strecke im Abstand cell_size ab, jeder Punkt der Strecke liegt damit
+    höchstens cell_size/2 neben einem Tastpunkt, dessen Zelle das getroffene Wandstück sicher enthält.
+    """
+    def __init__(self, segments, cell_segments, origin, shape, cell_size):
+        self.segments = segments
+        self.cell_segments = cell_segments
+        self.origin = np.asarray(origin, dtype=float)
+        self.shape = np.asarray(shape, dtype=np.intp)
+        self.cell_size = cell_size
+        #-1 in cell_segments zeigt auf diese NaN Strecke, die nie getroffen wird
+        self.padded_segments = np.concatenate((segments, np.full((1, 2, 2), np.nan)))
+
+    @classmethod
+    def build(cls, segments, bboxes, cell_size=GRID_CELL_SIZE):
+        """Baut das Gitter für Wandstücke (S, 2, 2) mit ihren Bounding Boxen (S, 4)"""
+        margin = cell_size / 2
+        low = bboxes[:, :2].min(axis=0) - margin
+        high = bboxes[:, 2:].max(axis=0) + margin
+        shape = np.maximum(np.ceil((high - low) / cell_size).astype(int), 1)
+        nx, ny = shape
+
+        cells = [[] for _ in range(nx * ny)]
+        box_low = np.clip(np.floor((bboxes[:, :2] - margin - low) / cell_size).astype(int), 0, shape - 1)
+        box_high = np.clip(np.floor((bboxes[:, 2:] + margin - low) / cell_size).astype(int), 0, shape - 1)
+        for i, ((x0, y0), (x1, y1)) in enumerate(zip(box_low, box_high)):
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    cells[cy * nx + cx].append(i)
+
+        #Zellen auf gleiche Länge auffüllen, -1 ist leer.
+        #Die letzte Zelle ist leer und steht für alles außerhalb des Gitters.
+        width = max(1, max(len(cell) for cell in cells))
+        cell_segments = np.full((nx * ny + 1, width), -1, dtype=np.intp)
+        for c, cell in enumerate(cells):
+            cell_segments[c, :len(cell)] = cell
+        return cls(segments, cell_segments, low, shape, cell_size)
+
+    def cells(self, points):
+        """Zellnummer für Punkte (..., 2), außerhalb des Gitters die leere Zelle"""
+        index = np.floor((points - self.origin) / self.cell_size).astype(np.intp)
+        inside = ((index >= 0) & (index < self.shape)).all(axis=-1)
+        return np.where(inside, index[..., 1] * self.shape[0] + index[..., 0], len(self.cell_segments) - 1)
+
+    def nearby(self, points):
+        """Indizes der Wandstücke (Q, C) in der Zelle jedes Punkts, -1 ist leer.
+        Darunter sind sicher alle Wandstücke, die höchstens cell_size/2 vom Punkt entfernt sind."""
+        return self.cell_segments[self.cells(np.asarray(points, dtype=float))]
+
+    def candidates(self, starts, ends):
+        """Indizes der Wandstücke (Q, C) die von den Strecken starts-ends (Q, 2) berührt werden könnten, -1 ist leer"""
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        length = np.hypot(*(ends - starts).T).max(initial=0)
+        steps = max(1, math.ceil(length / self.cell_size))
+        t = np.linspace(0, 1, steps + 1)[None, :, None]
+        cells = self.cells(starts[:, None, :] + t * (ends - starts)[:, None, :])
+        #gleiche Zelle hintereinander nur einmal abfragen
+        cells[:, 1:][cells[:, 1:] == cells[:, :-1]] = len(self.cell_segments) - 1
+        return self.cell_segments[cells].reshape(len(starts), cells.shape[1] * self.cell_segments.shape[1])
+
+    def candidate_segments(self, starts, ends):
+        """Wie candidates, aber gleich die Strecken (Q, C, 2, 2), leere Plätze sind NaN"""
+        return self.padded_segments[self.candidates(starts, ends)]
+
+    def any_intersection(self, starts, ends):
+        """Gibt für jede Strecke starts-ends (Q, 2) zurück ob sie eine Wand berührt"""
+        segments = self.candidate_segments(starts, ends)
+        hit, _ = segment_intersections(np.asarray(starts, dtype=float)[:, None, :], np.asarray(ends, dtype=float)[:, None, :],
+                                       segments[:, :, 0], segments[:, :, 1])
+        return hit.any(axis=-1)
+
+
+def segment_geometry(segments):
+    """Richtungen (S, 2), Normalen (S, 2) und Bounding Boxen (S, 4) der Wandstücke"""
+    delta = segments[:, 1] - segments[:, 0]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    directions = delta / np.where(length > 0, length, 1)[:, None]
+    normals = np.stack((-directions[:, 1], directions[:, 0]), axis=1)
+    bboxes = np.concatenate((segments.min(axis=1), segments.max(axis=1)), axis=1)
+    return directions, normals, bboxes
+
+
+class Track:
+    """Rennstrecke mit Außen- und Innenwand, Fitnesslinien, Startpunkt und Wandgitter"""
+    def __init__(self, outer_wall, inner_wall, fitness_lines, start_point, cell_size=GRID_CELL_SIZE, path=None, geometry=None):
+        self.outer_wall = np.asarray(outer_wall, dtype=float)
+        self.inner_wall = np.asarray(inner_wall, dtype=float)
+        self.fitness_lines = np.asarray(fitness_lines, dtype=float)
+        self.start_point = np.asarray(start_point, dtype=float).reshape(2)
+        self.path = path
+
+        #Hash über Wände, Fitnesslinien und Startpunkt, gleiche Strecken haben dieselbe Identität
+        digest = hashlib.sha1()
+        for array in (self.outer_wall, self.inner_wall, self.fitness_lines, self.start_point):
+            digest.update(np.ascontiguousarray(array, dtype="<f8").tobytes())
+            digest.update(str(array.shape).encode())
+        self.identity = digest.hexdigest()
+
+        if geometry is None:
+            walls = np.concatenate((polyline_segments(self.outer_wall), polyline_segments(self.inner_wall)))
+            directions, normals, bboxes = segment_geometry(walls)
+            grid = SegmentGrid.build(walls, bboxes, cell_size)
+        else:
+            walls = geometry["walls"].reshape(-1, 2, 2)
+            directions = geometry["directions"]
+            normals = geometry["normals"]
+            bboxes = geometry["bboxes"]
+            origin_x, origin_y, cell_size, nx, ny = geometry["grid_meta"][0]
+            grid = SegmentGrid(walls, geometry["grid_cells"], (origin_x, origin_y), (int(nx), int(ny)), cell_size)
+        self.walls = walls
+        self.directions = directions
+        self.normals = normals
+        self.bboxes = bboxes
+        self.grid = grid
+
+        #Fitnesslinien als Tore (G, 2, 2) in Fahrtrichtung
+        self.gates = self.fitness_lines.reshape(-1, 2, 2)
+
+    def __reduce__(self):
+        #Aus einer Datei geladene Strecken werden nur als Pfad gepickelt, der Worker mappt dieselbe Datei
+        if self.path is not None:
+            return (Track.load, (self.path,))
+        return (Track, (self.outer_wall, self.inner_wall, self.fitness_lines, self.start_point, self.grid.cell_size))
+
+    def arrays(self):
+        """Alle Arrays die in einer kompilierten Strecke gespeichert werden"""
+        grid = self.grid
+        return {
+            "outer": self.outer_wall,
+            "inner": self.inner_wall,
+            "fitness": self.fitness_lines,
+            "start": self.start_point.reshape(1, 2),
+            "walls": self.walls.reshape(-1, 4),
+            "directions": self.directions,
+            "normals": self.normals,
+            "bboxes": self.bboxes,
+            "grid_meta": np.array([[grid.origin[0], grid.origin[1], grid.cell_size, grid.shape[0], grid.shape[1]]]),
+            "grid_cells": grid.cell_segments.astype(np.int64),
+        }
+
+    def save(self, path):
+        """Schreibt die Strecke als kompilierte .track Datei, atomar über eine temporäre Datei"""
+        arrays = self.arrays()
+        offset = HEADER.size + ENTRY.size * len(arrays)
+        entries = []
+        for name, array in arrays.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            code = b"i8" if array.dtype.kind == "i" else b"f8"
+            entries.append((name, code, offset, array))
+            offset += array.size * 8
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(TRACK_MAGIC, TRACK_VERSION, len(entries)))
+            for name, code, offset, array in entries:
+                f.write(ENTRY.pack(name.encode(), code, offset, array.shape[0], array.shape[1]))
+            for name, code, offset, array in entries:
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(np.ascontiguousarray(array, dtype=DTYPES[code]).tobytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Lädt eine kompilierte .track Datei per memory map, die Arrays werden nicht kopiert"""
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, count = HEADER.unpack_from(data, 0)
+        if magic != TRACK_MAGIC:
+            raise ValueError("{} ist keine kompilierte Rennstrecke".format(path))
+        if version != TRACK_VERSION:
+            raise ValueError("{} hat Version {}, erwartet wird {}".format(path, version, TRACK_VERSION))
+
+        arrays = {}
+        for i in range(count):
+            name, code, offset, rows, cols = ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size)
+            array = np.frombuffer(data, dtype=DTYPES[code], count=rows * cols, offset=offset)
+            arrays[name.rstrip(b"\0").decode()] = array.reshape(rows, cols)
+        return cls(arrays["outer"], arrays["inner"], arrays["fitness"], arrays["start"], path=path, geometry=arrays)
+
+    @classmethod
+    def load_pickle(cls, outer_file="Rennstrecke_Aussen.txt", inner_file="Rennstrecke_Innen.txt",
+                    fitness_file="Fitnesslinien.txt", start_file="Startpunkt.txt"):
+        """Lädt eine Rennstrecke aus den alten Pickle Dateien von create_track.py"""
+        data = []
+        for filename in (outer_file, inner_file, fitness_file, start_file):
+            with open(filename, "rb") as f:
+                data.append(pickle.load(f))
+        return cls(*data)
+
+
+class TrackRegistry:
+    """Mehrere Rennstrecken unter ihrem Namen, in der Reihenfolge in der sie hinzugefügt wurden"""
+    def __init__(self, tracks=None):
+        self.tracks = dict(tracks or {})
+
+    @classmethod
+    def load(cls, paths):
+        """Lädt kompilierte .track Dateien, der Name ist der Dateiname ohne Endung"""
+        return cls((os.path.splitext(os.path.basename(path))[0], Track.load(path)) for path in paths)
+
+    @classmethod
+    def discover(cls, directory=".", pattern="*.track"):
+        """Lädt alle kompilierten Strecken in directory, sortiert nach Name"""
+        return cls.load(sorted(glob.glob(os.path.join(directory, pattern))))
+
+    def add(self, name, track):
+        """Fügt eine Strecke hinzu oder ersetzt die mit gleichem Namen"""
+        self.tracks[name] = track
+
+    def names(self):
+        return list(self.tracks)
+
+    def identity(self, names=None):
+        """Hash über die Identitäten der Strecken names (alle ohne names), für den Fitness Cache"""
+        names = self.names() if names is None else names
+        return hashlib.sha1(repr([(name, self.tracks[name].identity) for name in names]).encode()).hexdigest()
+
+    def __getitem__(self, name):
+        return self.tracks[name]
+
+    def __iter__(self):
+        return iter(self.tracks)
+
+    def __len__(self):
+        return len(self.tracks)
+
+
+def convert_pickle_track(output="Rennstrecke.track", **pickle_files):
+    """Wandelt eine Strecke aus Pickle Dateien in eine kompilierte .track Datei um"""
+    track = Track.load_pickle(**pickle_files)
+    track.save(output)
+    return track
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Wandelt eine Rennstrecke aus Pickle Dateien in das kompilierte .track Format um")
+    parser.add_argument("--outer", default="Rennstrecke_Aussen.txt")
+    parser.add_argument("--inner", default="Rennstrecke_Innen.txt")
+    parser.add_argument("--fitness", default="Fitnesslinien.txt")
+    parser.add_argument("--start", default="Startpunkt.txt")
+    parser.add_argument("-o", "--output", default="Rennstrecke.track")
+    args = parser.parse_args()
+    convert_pickle_track(args.output, outer_file=args.outer, inner_file=args.inner,
+                         fitness_file=args.fitness, start_file=args.start)